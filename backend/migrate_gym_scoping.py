@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+One-shot migration to location-scoped (gym_id) collections.
+
+Stamps documents written before multi-site support with DEFAULT_GYM_ID,
+builds the gym_id-prefixed indexes, drops the secondary indexes they
+replace and, with --shard, shards every location-scoped collection
+on (gym_id, _id). Users stay unsharded so email can remain unique.
+
+Run from backend/ (with --shard, MONGO_URL must point at a mongos):
+    python migrate_gym_scoping.py [--shard]
+Re-running is safe.
+"""
+
+import argparse
+import asyncio
+
+import server
+
+# Indexes kept although they do not start with gym_id
+KEPT_INDEXES = {"_id_", "email_1"}
+
+
+async def drop_unscoped_indexes(name):
+    dropped = []
+    async for index in server.db[name].list_indexes():
+        if index["name"] in KEPT_INDEXES or next(iter(index["key"])) == "gym_id":
+            continue
+        await server.db[name].drop_index(index["name"])
+        dropped.append(index["name"])
+    return dropped
+
+
+async def shard_collections():
+    await server.client.admin.command("enableSharding", server.db.name)
+    for name in server.SHARDED_COLLECTIONS:
+        await server.client.admin.command(
+            "shardCollection", f"{server.db.name}.{name}", key=dict(server.SHARD_KEY)
+        )
+        print(f"✅ {name}: sharded on {dict(server.SHARD_KEY)}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shard", action="store_true", help="shard the location-scoped collections on (gym_id, _id)")
+    args = parser.parse_args()
+
+    server.connect_mongo()
+    try:
+        await server.backfill_gym_ids()
+        print(f"✅ Documents without a location assigned to '{server.DEFAULT_GYM_ID}'")
+        # Build the replacements before dropping anything; this also creates each shard key's index
+        await server.ensure_indexes()
+        print("✅ Location-scoped indexes built")
+        existing = set(await server.db.list_collection_names())
+        for name in server.GYM_SCOPED_COLLECTIONS:
+            if name in existing:
+                dropped = await drop_unscoped_indexes(name)
+                print(f"✅ {name}: dropped {len(dropped)} superseded indexes", *dropped)
+        if args.shard:
+            await shard_collections()
+    finally:
+        server.close_mongo()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+One-shot migration to UUID primary keys.
+
+Moves every document's string UUID `id` into `_id` as a BSON binary UUID,
+drops the indexes that only served `id`, strips denormalized fields that
+are no longer read, and reports data and index size saved per collection.
+
+Each document is swapped for its copy on its own. The copy is inserted
+before the legacy document is deleted, so an interrupted run loses
+nothing. Users are the exception: the unique email index rejects a copy
+while the legacy document exists, so the legacy document goes first
+(inside a transaction on a replica set). Each batch is therefore backed up
+to users_legacy beforehand, and a re-run restores any user an interrupted
+run deleted without storing the copy. Drop users_legacy once the migrated
+users have been checked.
+
+Stop the API first, then run from backend/:
+    python migrate_uuid_ids.py [--batch-size 1000] [--concurrency 20] [--compact]
+Re-running is safe; already migrated documents are skipped.
+"""
+
+import argparse
+import asyncio
+import uuid
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+
+import server
+
+COLLECTIONS = ["users", "classes", "bookings", "payments", "progress", "feedback", "notifications", "member_stats"]
+# Field holding the string UUID that becomes _id (member_stats was keyed by member)
+SOURCE_ID_FIELDS = {"member_stats": "member_id"}
+# Denormalized fields no read path needs any more
+DROPPED_FIELDS = {"bookings": ["member_name"]}
+# Collections whose unique secondary index (users.email) the copy would collide with, so the
+# legacy document is deleted first; they are backed up to <name>_legacy before each batch
+DELETE_FIRST = {"users"}
+
+
+async def collection_stats(name):
+    stats = await server.db.command("collStats", name)
+    return {
+        "count": stats.get("count", 0),
+        "size": stats.get("size", 0),
+        "storage_size": stats.get("storageSize", 0),
+        "index_size": stats.get("totalIndexSize", 0),
+    }
+
+
+async def drop_source_id_indexes(collection, source_field):
+    # A unique index on the old field would reject the second document without it
+    async for index in collection.list_indexes():
+        if source_field in index["key"]:
+            await collection.drop_index(index["name"])
+
+
+def new_id_of(document, source_field):
+    try:
+        return uuid.UUID(str(document.get(source_field)))
+    except ValueError:
+        return None
+
+
+async def convert_document(collection, legacy_document, document, delete_first, session=None):
+    if not delete_first:
+        # The legacy document stays until its copy is stored
+        await collection.insert_one(document, session=session)
+        await collection.delete_one({"_id": legacy_document["_id"]}, session=session)
+        return
+    await collection.delete_one({"_id": legacy_document["_id"]}, session=session)
+    try:
+        await collection.insert_one(document, session=session)
+    except PyMongoError:
+        if session is None:
+            # Without a transaction nothing rolls back, so put the legacy document back
+            await collection.insert_one(legacy_document)
+        raise
+
+
+async def migrate_document(collection, legacy_document, document, delete_first, use_transactions):
+    try:
+        if delete_first and use_transactions:
+            async with await server.client.start_session() as session:
+                await session.with_transaction(
+                    lambda session: convert_document(collection, legacy_document, document, True, session)
+                )
+        else:
+            await convert_document(collection, legacy_document, document, delete_first)
+    except DuplicateKeyError:
+        # Only a document already stored under the new _id means an earlier run migrated this one
+        if not await collection.find_one({"_id": document["_id"]}, {"_id": 1}):
+            raise
+        await collection.delete_one({"_id": legacy_document["_id"]})
+
+
+async def back_up_documents(backup, documents):
+    try:
+        await backup.insert_many(documents, ordered=False)
+    except BulkWriteError as exc:
+        # Backed up by an earlier run
+        if any(error["code"] != 11000 for error in exc.details["writeErrors"]):
+            raise
+
+
+async def restore_lost_documents(collection, backup, source_field, batch_size):
+    """Put back backed-up documents an interrupted run deleted before storing their copy"""
+    restored = 0
+    last_id = ObjectId("0" * 24)
+    while True:
+        batch = await backup.find({"_id": {"$gt": last_id}}).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        new_ids = {document["_id"]: new_id_of(document, source_field) for document in batch}
+        present = await collection.find(
+            {"_id": {"$in": [*new_ids, *filter(None, new_ids.values())]}}, {"_id": 1}
+        ).to_list(length=None)
+        present_ids = {document["_id"] for document in present}
+        lost = [
+            document for document in batch
+            if document["_id"] not in present_ids and new_ids[document["_id"]] not in present_ids
+        ]
+        if lost:
+            await collection.insert_many(lost)
+            restored += len(lost)
+    return restored
+
+
+async def migrate_collection(name, batch_size, use_transactions=False, concurrency=20):
+    collection = server.db[name]
+    source_field = SOURCE_ID_FIELDS.get(name, "id")
+    skipped_fields = {"_id", source_field, *DROPPED_FIELDS.get(name, [])}
+    delete_first = name in DELETE_FIRST
+    await drop_source_id_indexes(collection, source_field)
+    if delete_first:
+        backup = server.db[f"{name}_legacy"]
+        restored = await restore_lost_documents(collection, backup, source_field, batch_size)
+        if restored:
+            print(f"↩️  {name}: restored {restored} documents from {name}_legacy")
+    slots = asyncio.Semaphore(concurrency)
+
+    async def migrate_bounded(legacy_document, document):
+        async with slots:
+            await migrate_document(collection, legacy_document, document, delete_first, use_transactions)
+
+    migrated = invalid = 0
+    last_id = ObjectId("0" * 24)
+    while True:
+        # Walk legacy documents in _id order so each batch is an index range scan
+        batch = await collection.find(
+            {"_id": {"$type": "objectId", "$gt": last_id}}
+        ).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        if delete_first:
+            await back_up_documents(backup, batch)
+
+        conversions = []
+        for document in batch:
+            new_id = new_id_of(document, source_field)
+            if new_id is None:
+                invalid += 1
+                continue
+            migrated_document = {key: value for key, value in document.items() if key not in skipped_fields}
+            migrated_document["_id"] = new_id
+            conversions.append(migrate_bounded(document, migrated_document))
+        await asyncio.gather(*conversions)
+        migrated += len(conversions)
+
+    dropped = DROPPED_FIELDS.get(name)
+    if dropped:
+        await collection.update_many(
+            {"$or": [{field: {"$exists": True}} for field in dropped]},
+            {"$unset": {field: "" for field in dropped}}
+        )
+    return migrated, invalid
+
+
+def format_bytes(value):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(value) < 1024 or unit == "GB":
+            return f"{value:,.1f} {unit}"
+        value /= 1024
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20, help="documents converted at once")
+    parser.add_argument("--compact", action="store_true", help="run compact afterwards to release storage to the OS")
+    args = parser.parse_args()
+
+    server.connect_mongo()
+    existing = set(await server.db.list_collection_names())
+    use_transactions = await server.detect_replica_set()
+    if not use_transactions:
+        print("⚠️  MongoDB is not a replica set; users are converted without transactions (backed up to users_legacy)")
+    report = []
+    try:
+        for name in COLLECTIONS:
+            if name not in existing:
+                continue
+            before = await collection_stats(name)
+            migrated, invalid = await migrate_collection(name, args.batch_size, use_transactions, args.concurrency)
+            if args.compact:
+                await server.db.command("compact", name)
+            after = await collection_stats(name)
+            report.append((name, migrated, invalid, before, after))
+            print(f"✅ {name}: migrated {migrated} documents ({invalid} with invalid ids left untouched)")
+        # Recreate the indexes the API expects (e.g. users by name then _id)
+        await server.ensure_indexes()
+    finally:
+        server.close_mongo()
+
+    print("\n=== SPACE REPORT ===")
+    print(f"{'collection':<15}{'data before':>14}{'data after':>14}{'index before':>14}{'index after':>14}{'saved':>14}")
+    for name, _, _, before, after in report:
+        saved = (before["size"] + before["index_size"]) - (after["size"] + after["index_size"])
+        print(
+            f"{name:<15}{format_bytes(before['size']):>14}{format_bytes(after['size']):>14}"
+            f"{format_bytes(before['index_size']):>14}{format_bytes(after['index_size']):>14}{format_bytes(saved):>14}"
+        )
+    if not args.compact:
+        print("\nStorage size only shrinks on disk after compact (--compact) or a resync.")
+    backed_up = [f"{name}_legacy" for name, migrated, _, _, _ in report if name in DELETE_FIRST and migrated]
+    if backed_up:
+        print(f"Pre-migration copies are kept in {', '.join(backed_up)}; drop them once the migration is verified.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+"""
+PayPal Orders API client shared by every request in a worker.
+
+One pooled httpx client keeps connections to PayPal warm, the OAuth access
+token is cached until shortly before it expires, a semaphore bounds calls in
+flight, and transient failures are retried with jittered exponential backoff.
+Order creation and capture send a PayPal-Request-Id so retries are idempotent.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger("supreme_fitness.payments")
+
+# Statuses worth retrying; anything else is returned to the caller as an error
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class PaymentGatewayError(Exception):
+    """Raised when PayPal rejects a call or stays unreachable after retries"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, details: Any = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+
+class PayPalGateway:
+    def __init__(
+        self,
+        base_url: str,
+        client_id: str,
+        secret: str,
+        max_concurrency: int = 20,
+        timeout_seconds: float = 10,
+        max_retries: int = 3,
+        backoff_seconds: float = 0.2,
+        token_refresh_margin_seconds: float = 300,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.client_id = client_id
+        self.secret = secret
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.token_refresh_margin_seconds = token_refresh_margin_seconds
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        self.timeout = httpx.Timeout(timeout_seconds)
+        self.client: Optional[httpx.AsyncClient] = None
+        self.token: Optional[str] = None
+        self.token_expires_at = 0.0
+        self.token_lock = asyncio.Lock()
+        self.metrics = {"requests": 0, "retries": 0, "token_fetches": 0, "errors": 0}
+
+    def http(self) -> httpx.AsyncClient:
+        # Created lazily so the client binds to the event loop that serves requests
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(base_url=self.base_url, limits=self.limits, timeout=self.timeout)
+        return self.client
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def access_token(self) -> str:
+        if self.token and time.monotonic() < self.token_expires_at:
+            return self.token
+        async with self.token_lock:
+            # Another caller may have refreshed it while we waited
+            if self.token and time.monotonic() < self.token_expires_at:
+                return self.token
+            response = await self.send(
+                "POST",
+                "/v1/oauth2/token",
+                data={"grant_type": "client_credentials"},
+                auth=(self.client_id, self.secret),
+            )
+            body = response.json()
+            self.metrics["token_fetches"] += 1
+            self.token = body["access_token"]
+            lifetime = float(body.get("expires_in", 0))
+            self.token_expires_at = time.monotonic() + max(lifetime - self.token_refresh_margin_seconds, lifetime / 2)
+            return self.token
+
+    def invalidate_token(self):
+        self.token = None
+        self.token_expires_at = 0.0
+
+    async def send(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send one call with bounded concurrency and retries on transient failures"""
+        attempt = 0
+        while True:
+            try:
+                async with self.slots:
+                    self.metrics["requests"] += 1
+                    response = await self.http().request(method, path, **kwargs)
+                if response.status_code not in RETRYABLE_STATUSES:
+                    break
+                failure = f"PayPal returned {response.status_code}"
+            except httpx.TransportError as exc:
+                response = None
+                failure = f"PayPal unreachable: {exc!r}"
+            if attempt >= self.max_retries:
+                self.metrics["errors"] += 1
+                raise PaymentGatewayError(failure, response.status_code if response is not None else None)
+            attempt += 1
+            self.metrics["retries"] += 1
+            delay = self.backoff_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            if response is not None and response.headers.get("Retry-After", "").isdigit():
+                delay = max(delay, float(response.headers["Retry-After"]))
+            logger.warning("%s, retrying %s %s in %.2fs", failure, method, path, delay)
+            await asyncio.sleep(delay)
+
+        if response.is_error:
+            self.metrics["errors"] += 1
+            raise PaymentGatewayError(
+                f"PayPal returned {response.status_code}", response.status_code, response.text
+            )
+        return response
+
+    async def call(self, method: str, path: str, request_id: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        headers = {"Authorization": f"Bearer {await self.access_token()}"}
+        if request_id:
+            headers["PayPal-Request-Id"] = request_id
+        try:
+            response = await self.send(method, path, headers=headers, **kwargs)
+        except PaymentGatewayError as exc:
+            if exc.status_code != 401:
+                raise
+            # Token revoked or expired early; fetch a fresh one once
+            self.invalidate_token()
+            headers["Authorization"] = f"Bearer {await self.access_token()}"
+            response = await self.send(method, path, headers=headers, **kwargs)
+        return response.json()
+
+    async def create_order(self, reference_id: str, amount: float, currency: str = "USD") -> Dict[str, Any]:
+        return await self.call("POST", "/v2/checkout/orders", request_id=f"create-{reference_id}", json={
+            "intent": "CAPTURE",
+            "purchase_units": [{
+                "reference_id": reference_id,
+                "amount": {"currency_code": currency, "value": f"{amount:.2f}"}
+            }]
+        })
+
+    async def capture_order(self, order_id: str) -> Dict[str, Any]:
+        return await self.call("POST", f"/v2/checkout/orders/{order_id}/capture", request_id=f"capture-{order_id}", json={})
+
+    async def get_order(self, order_id: str) -> Dict[str, Any]:
+        return await self.call("GET", f"/v2/checkout/orders/{order_id}")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the PayPal REST endpoints the payment gateway uses.
+
+Orders are kept in memory and start out APPROVED, as if the buyer had
+already approved them in the browser. Latency and a failure rate can be
+injected to exercise the gateway's pooling, retries and token cache.
+Run from backend/ and point the API at it:
+    python paypal_stub.py --port 8099 --latency-ms 50 --failure-rate 0.05
+    PAYPAL_BASE_URL=http://127.0.0.1:8099 PAYPAL_ENABLED=true uvicorn server:app
+"""
+
+import argparse
+import asyncio
+import random
+import uuid
+
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+settings = {"latency_ms": 0.0, "failure_rate": 0.0, "token_ttl": 32400}
+orders = {}
+# PayPal-Request-Id -> response body, so retried calls get the original answer
+replies = {}
+stats = {"token_requests": 0, "order_requests": 0, "injected_failures": 0}
+tokens = set()
+
+app = FastAPI(title="PayPal Stub")
+
+
+async def simulate_network():
+    if settings["latency_ms"]:
+        await asyncio.sleep(settings["latency_ms"] / 1000)
+    if random.random() < settings["failure_rate"]:
+        stats["injected_failures"] += 1
+        raise HTTPException(status_code=503, detail="Injected failure")
+
+
+def check_token(authorization):
+    if not authorization or authorization.removeprefix("Bearer ") not in tokens:
+        raise HTTPException(status_code=401, detail="Invalid access token")
+
+
+@app.post("/v1/oauth2/token")
+async def issue_token():
+    await simulate_network()
+    stats["token_requests"] += 1
+    token = uuid.uuid4().hex
+    tokens.add(token)
+    return {"access_token": token, "token_type": "Bearer", "expires_in": settings["token_ttl"]}
+
+
+@app.post("/v2/checkout/orders", status_code=201)
+async def create_order(
+    request: Request,
+    authorization: str = Header(None),
+    paypal_request_id: str = Header(None)
+):
+    await simulate_network()
+    check_token(authorization)
+    stats["order_requests"] += 1
+    if paypal_request_id in replies:
+        return replies[paypal_request_id]
+    body = await request.json()
+    order = {
+        "id": uuid.uuid4().hex[:17].upper(),
+        "intent": body.get("intent", "CAPTURE"),
+        "status": "APPROVED",
+        "purchase_units": body.get("purchase_units", []),
+        "links": [],
+    }
+    orders[order["id"]] = order
+    if paypal_request_id:
+        replies[paypal_request_id] = order
+    return order
+
+
+@app.get("/v2/checkout/orders/{order_id}")
+async def get_order(order_id: str, authorization: str = Header(None)):
+    await simulate_network()
+    check_token(authorization)
+    stats["order_requests"] += 1
+    if order_id not in orders:
+        raise HTTPException(status_code=404, detail="RESOURCE_NOT_FOUND")
+    return orders[order_id]
+
+
+@app.post("/v2/checkout/orders/{order_id}/capture", status_code=201)
+async def capture_order(order_id: str, authorization: str = Header(None), paypal_request_id: str = Header(None)):
+    await simulate_network()
+    check_token(authorization)
+    stats["order_requests"] += 1
+    if paypal_request_id in replies:
+        return replies[paypal_request_id]
+    order = orders.get(order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="RESOURCE_NOT_FOUND")
+    if order["status"] == "COMPLETED":
+        return JSONResponse(status_code=422, content={"name": "UNPROCESSABLE_ENTITY", "details": [{"issue": "ORDER_ALREADY_CAPTURED"}]})
+    order["status"] = "COMPLETED"
+    if paypal_request_id:
+        replies[paypal_request_id] = order
+    return order
+
+
+@app.post("/stub/orders/{order_id}/status")
+async def set_order_status(order_id: str, status: str):
+    """Test hook: move an order to any status (e.g. VOIDED for an abandoned checkout)"""
+    if order_id not in orders:
+        raise HTTPException(status_code=404, detail="RESOURCE_NOT_FOUND")
+    orders[order_id]["status"] = status
+    return orders[order_id]
+
+
+@app.post("/stub/tokens/revoke")
+async def revoke_tokens():
+    """Test hook: invalidate every issued token to exercise the gateway's 401 refresh"""
+    tokens.clear()
+    return {"message": "Tokens revoked"}
+
+
+@app.get("/stub/stats")
+async def get_stats():
+    return {**stats, "orders": len(orders)}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--token-ttl", type=int, default=32400, help="access token lifetime in seconds")
+    args = parser.parse_args()
+    settings.update(latency_ms=args.latency_ms, failure_rate=args.failure_rate, token_ttl=args.token_ttl)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
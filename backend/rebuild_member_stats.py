@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Rebuild every member's stats document from bookings (hot and archived),
+payments and progress entries.
+
+The API keeps member_stats current incrementally; run this to reconcile
+after a backfill, an import or a suspected drift. Each document is
+replaced wholesale, so increments the API makes during the rebuild would
+be lost: stop the API first, then run from backend/:
+    python rebuild_member_stats.py [--batch-size 500]
+"""
+
+import argparse
+import asyncio
+import time
+
+import server
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    server.connect_mongo()
+    try:
+        started = time.monotonic()
+        rebuilt = await server.rebuild_member_stats(args.batch_size)
+        elapsed = time.monotonic() - started
+    finally:
+        server.close_mongo()
+    print(f"✅ Rebuilt stats for {rebuilt} members in {elapsed:.1f}s ({rebuilt / max(elapsed, 1e-9):.0f} members/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
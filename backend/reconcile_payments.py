@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Reconcile stale pending payments against PayPal once, outside the scheduler.
+
+Runs the same job the API schedules every RECONCILE_INTERVAL_SECONDS and
+prints what it settled. Safe while the API is up. Run from backend/:
+    python reconcile_payments.py [--batch-size 200] [--concurrency 10]
+"""
+
+import argparse
+import asyncio
+import time
+
+import server
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=server.RECONCILE_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=server.RECONCILE_CONCURRENCY)
+    args = parser.parse_args()
+    server.RECONCILE_BATCH_SIZE = args.batch_size
+    server.RECONCILE_CONCURRENCY = args.concurrency
+
+    server.connect_mongo()
+    try:
+        started = time.monotonic()
+        report = await server.reconcile_pending_payments()
+        elapsed = time.monotonic() - started
+    finally:
+        await server.payment_gateway.aclose()
+        server.close_mongo()
+    print(
+        f"✅ Checked {report['checked']} pending payments in {elapsed:.1f}s "
+        f"({report['payments_per_second']:.0f} payments/s)"
+    )
+    print(
+        f"   completed (captured at PayPal, pending here): {report['mismatches']}, "
+        f"failed: {report['failed']}, still pending: {report['pending']}, gateway errors: {report['error']}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,28 +1,929 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Request
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel, Field
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, ReplaceOne, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
+from pymongo.read_preferences import SecondaryPreferred
+from contextlib import asynccontextmanager
+from pydantic import AliasChoices, BaseModel, Field, field_validator
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from passlib.context import CryptContext
 import jwt
+import logging
 import uuid
 import os
 from enum import Enum
+import numpy as np
+import pandas as pd
+from payment_gateway import PayPalGateway, PaymentGatewayError
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
 import asyncio
+import base64
+import bisect
+import csv
+import heapq
+import io
+import itertools
+import json
+import math
+import random
+import re
+import socket
+import tempfile
+import threading
+import time
 
 # Environment variables
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017/supreme_fitness')
 SECRET_KEY = "supreme_fitness_secret_key_2024"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+# Multi-document transactions need a replica set (a single-node one is enough locally,
+# e.g. mongodb://localhost:27017/?replicaSet=rs0) or mongos. "auto" uses them only when the
+# server supports them, so a standalone mongod falls back to non-transactional writes.
+MONGO_TRANSACTIONS = os.environ.get('MONGO_TRANSACTIONS', 'auto').lower()
+# Location that documents written before multi-site support belong to, and the default for sign-ups
+DEFAULT_GYM_ID = os.environ.get('DEFAULT_GYM_ID', 'main')
+# Comma-separated locations a sign-up may pick; DEFAULT_GYM_ID is always one of them
+GYM_IDS = {DEFAULT_GYM_ID, *(gym.strip() for gym in os.environ.get('GYM_IDS', '').split(',') if gym.strip())}
+
+# In-process caches; change streams keep them coherent across worker processes
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', '30'))
+CACHE_INVALIDATION_STREAM = os.environ.get('CACHE_INVALIDATION_STREAM', 'true').lower() == 'true'
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '1'))
+
+# Background jobs; with several workers only the lease holder runs each job
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+LIFECYCLE_INTERVAL_SECONDS = float(os.environ.get('LIFECYCLE_INTERVAL_SECONDS', '300'))
+LIFECYCLE_BATCH_SIZE = int(os.environ.get('LIFECYCLE_BATCH_SIZE', '500'))
+# Time after a class ends during which trainers can still check members in
+LIFECYCLE_GRACE_MINUTES = int(os.environ.get('LIFECYCLE_GRACE_MINUTES', '60'))
+# Completed and cancelled classes (with their bookings) move to *_archive collections after this age
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_INTERVAL_SECONDS = float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', '3600'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '200'))
+# Pending payments older than RECONCILE_STALE_MINUTES are checked against PayPal; those
+# still unpaid after RECONCILE_EXPIRE_HOURS are marked failed
+RECONCILE_INTERVAL_SECONDS = float(os.environ.get('RECONCILE_INTERVAL_SECONDS', '900'))
+RECONCILE_BATCH_SIZE = int(os.environ.get('RECONCILE_BATCH_SIZE', '200'))
+RECONCILE_CONCURRENCY = int(os.environ.get('RECONCILE_CONCURRENCY', '10'))
+RECONCILE_STALE_MINUTES = int(os.environ.get('RECONCILE_STALE_MINUTES', '60'))
+RECONCILE_EXPIRE_HOURS = int(os.environ.get('RECONCILE_EXPIRE_HOURS', '24'))
+# Load shedding: requests beyond the in-flight cap queue by route priority within a latency budget
+MAX_IN_FLIGHT_REQUESTS = int(os.environ.get('MAX_IN_FLIGHT_REQUESTS', '256'))
+MAX_QUEUED_REQUESTS = int(os.environ.get('MAX_QUEUED_REQUESTS', '512'))
+QUEUE_LATENCY_BUDGET_MS = float(os.environ.get('QUEUE_LATENCY_BUDGET_MS', '500'))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Login throttling and bcrypt admission control, for the whole server: with WEB_CONCURRENCY
+# workers each one enforces 1/WEB_CONCURRENCY of these, as a worker only sees its own requests
+LOGIN_EMAIL_RATE_PER_MINUTE = float(os.environ.get('LOGIN_EMAIL_RATE_PER_MINUTE', '5'))
+LOGIN_EMAIL_BURST = int(os.environ.get('LOGIN_EMAIL_BURST', '5'))
+LOGIN_IP_RATE_PER_MINUTE = float(os.environ.get('LOGIN_IP_RATE_PER_MINUTE', '30'))
+LOGIN_IP_BURST = int(os.environ.get('LOGIN_IP_BURST', '20'))
+MAX_CONCURRENT_PASSWORD_CHECKS = int(os.environ.get('MAX_CONCURRENT_PASSWORD_CHECKS', str(os.cpu_count() or 2)))
+# The app is deployed behind the preview ingress, which appends the real client address to
+# X-Forwarded-For; without it every login would share the ingress IP's bucket. Set
+# TRUST_FORWARDED_FOR=false when clients connect directly, and TRUSTED_PROXY_HOPS to the
+# number of proxies in front of the app.
+TRUST_FORWARDED_FOR = os.environ.get('TRUST_FORWARDED_FOR', 'true').lower() == 'true'
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '1'))
 
 # PayPal Configuration
-PAYPAL_CLIENT_ID = "AYA7mRHI-QvYo5SVaMYW_kcqcNzlM-LydGQgwViOcSmoiVpDg8oRg1nHbRzs-YYXJvJFbB7V6Sz9xhb4"
-PAYPAL_SECRET = "EHYiGd1-s7vxIpxkb7qbl5IJqNWEF9qEK9bEQ2T4HewE00I5zsxsSTB89eDBtWrOLomuWMVdn3pbgJ2G"
+PAYPAL_CLIENT_ID = os.environ.get('PAYPAL_CLIENT_ID', "AYA7mRHI-QvYo5SVaMYW_kcqcNzlM-LydGQgwViOcSmoiVpDg8oRg1nHbRzs-YYXJvJFbB7V6Sz9xhb4")
+PAYPAL_SECRET = os.environ.get('PAYPAL_SECRET', "EHYiGd1-s7vxIpxkb7qbl5IJqNWEF9qEK9bEQ2T4HewE00I5zsxsSTB89eDBtWrOLomuWMVdn3pbgJ2G")
+# Off by default: checkout then trusts the order id the client reports, as before
+PAYPAL_ENABLED = os.environ.get('PAYPAL_ENABLED', 'false').lower() == 'true'
+PAYPAL_BASE_URL = os.environ.get('PAYPAL_BASE_URL', 'https://api-m.sandbox.paypal.com')
+PAYPAL_MAX_CONCURRENCY = int(os.environ.get('PAYPAL_MAX_CONCURRENCY', '20'))
+PAYPAL_TIMEOUT_SECONDS = float(os.environ.get('PAYPAL_TIMEOUT_SECONDS', '10'))
+PAYPAL_MAX_RETRIES = int(os.environ.get('PAYPAL_MAX_RETRIES', '3'))
+
+# One per worker process so connections and the access token are shared by all requests
+payment_gateway = PayPalGateway(
+    PAYPAL_BASE_URL,
+    PAYPAL_CLIENT_ID,
+    PAYPAL_SECRET,
+    max_concurrency=PAYPAL_MAX_CONCURRENCY,
+    timeout_seconds=PAYPAL_TIMEOUT_SECONDS,
+    max_retries=PAYPAL_MAX_RETRIES
+)
+
+# MongoDB connection
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Tracks connection pool utilization per server; pymongo calls these hooks from its own threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Each server (primary, every secondary) has its own pool capped at MONGO_MAX_POOL_SIZE
+        self.open: Dict[tuple, int] = {}
+        self.in_use: Dict[tuple, int] = {}
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.pools_cleared = 0
+
+    def _add(self, counts: Dict[tuple, int], address, delta: int):
+        counts[address] = counts.get(address, 0) + delta
+
+    def connection_created(self, event):
+        with self.lock:
+            self._add(self.open, event.address, 1)
+
+    def connection_closed(self, event):
+        with self.lock:
+            self._add(self.open, event.address, -1)
+
+    def connection_checked_out(self, event):
+        with self.lock:
+            self._add(self.in_use, event.address, 1)
+            self.checkouts += 1
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self._add(self.in_use, event.address, -1)
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self.checkout_failures += 1
+
+    def pool_cleared(self, event):
+        with self.lock:
+            self.pools_cleared += 1
+
+    def pool_closed(self, event):
+        with self.lock:
+            self.open.pop(event.address, None)
+            self.in_use.pop(event.address, None)
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            servers = [
+                {
+                    "address": f"{address[0]}:{address[1]}",
+                    "open_connections": self.open.get(address, 0),
+                    "in_use": self.in_use.get(address, 0),
+                    "utilization": round(self.in_use.get(address, 0) / MONGO_MAX_POOL_SIZE, 3),
+                }
+                for address in sorted(set(self.open) | set(self.in_use))
+            ]
+            return {
+                "max_pool_size": MONGO_MAX_POOL_SIZE,
+                "min_pool_size": MONGO_MIN_POOL_SIZE,
+                "open_connections": sum(self.open.values()),
+                "in_use": sum(self.in_use.values()),
+                # The busiest pool is the one that saturates first
+                "utilization": max((server["utilization"] for server in servers), default=0.0),
+                "servers": servers,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pools_cleared": self.pools_cleared,
+            }
+
+pool_stats = PoolStatsListener()
+client: Optional[AsyncIOMotorClient] = None
+db = None
+# Admin analytics and list reads tolerate replication lag, so keep them off the primary.
+# Anything that fills a cache reads from the primary instead.
+read_db = None
+
+def connect_mongo():
+    global client, db, read_db
+    client = AsyncIOMotorClient(
+        MONGO_URL,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        event_listeners=[pool_stats],
+        uuidRepresentation="standard",
+    )
+    db = client.supreme_fitness
+    read_db = client.get_database(db.name, read_preference=SecondaryPreferred())
+
+def close_mongo():
+    if client is not None:
+        client.close()
+
+# Set at startup from the server's hello reply
+replica_set_available = False
+transactions_enabled = False
+
+async def detect_replica_set() -> bool:
+    """Transactions and change streams need a replica set member or mongos"""
+    hello = await client.admin.command("hello")
+    return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+# Everything a site reads is prefixed by gym_id, so a location's queries stay on its own index
+# ranges and, once sharded on SHARD_KEY, on its own shards. Users stay unsharded: login looks
+# them up by an email that must be unique across sites.
+SHARD_KEY = [("gym_id", ASCENDING), ("_id", ASCENDING)]
+SHARDED_COLLECTIONS = [
+    "classes", "bookings", "payments", "progress", "feedback", "notifications",
+    "member_stats", "classes_archive", "bookings_archive",
+]
+GYM_SCOPED_COLLECTIONS = ["users", *SHARDED_COLLECTIONS]
+
+async def ensure_indexes():
+    # The text index gained a gym_id prefix and a collection may only have one text index
+    if "class_text" in await db.classes.index_information():
+        try:
+            await db.classes.drop_index("class_text")
+        except OperationFailure as exc:
+            # IndexNotFound: another worker starting up dropped it first
+            if exc.code != 27:
+                raise
+    await asyncio.gather(
+        db.users.create_indexes([
+            IndexModel("email", unique=True),
+            IndexModel([("gym_id", ASCENDING), ("role", ASCENDING), ("is_active", ASCENDING)]),
+            IndexModel([("gym_id", ASCENDING), ("full_name_lower", ASCENDING), ("_id", ASCENDING)]),
+            IndexModel([("gym_id", ASCENDING), ("email_lower", ASCENDING)]),
+        ]),
+        db.classes.create_indexes([
+            IndexModel(SHARD_KEY),
+            IndexModel([("gym_id", ASCENDING), ("status", ASCENDING), ("start_time", ASCENDING)]),
+            IndexModel([("gym_id", ASCENDING), ("status", ASCENDING), ("end_time", ASCENDING)]),
+            IndexModel([("gym_id", ASCENDING), ("trainer_id", ASCENDING), ("start_time", ASCENDING)]),
+            IndexModel(
+                [("gym_id", ASCENDING), ("series_id", ASCENDING), ("start_time", ASCENDING)],
+                partialFilterExpression={"series_id": {"$exists": True}}
+            ),
+            IndexModel(
+                [("gym_id", ASCENDING), ("name", TEXT), ("description", TEXT), ("trainer_name", TEXT)],
+                weights={"name": 10, "trainer_name": 5, "description": 1},
+                name="class_text_by_gym"
+            ),
+        ]),
+        db.bookings.create_indexes([
+            IndexModel(SHARD_KEY),
+            IndexModel([("gym_id", ASCENDING), ("member_id", ASCENDING), ("class_id", ASCENDING), ("status", ASCENDING)]),
+            IndexModel([("gym_id", ASCENDING), ("member_id", ASCENDING), ("class_start_time", ASCENDING)]),
+            IndexModel([("gym_id", ASCENDING), ("class_id", ASCENDING), ("status", ASCENDING)]),
+            IndexModel([("gym_id", ASCENDING), ("member_id", ASCENDING), ("booking_time", DESCENDING), ("_id", DESCENDING)]),
+        ]),
+        db.payments.create_indexes([
+            IndexModel(SHARD_KEY),
+            IndexModel([("gym_id", ASCENDING), ("status", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+            IndexModel([("gym_id", ASCENDING), ("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        ]),
+        db.progress.create_indexes([
+            IndexModel(SHARD_KEY),
+            IndexModel([("gym_id", ASCENDING), ("member_id", ASCENDING), ("recorded_date", DESCENDING), ("_id", DESCENDING)]),
+        ]),
+        db.classes_archive.create_indexes([
+            IndexModel(SHARD_KEY),
+            IndexModel([("gym_id", ASCENDING), ("trainer_id", ASCENDING), ("start_time", ASCENDING)]),
+        ]),
+        db.bookings_archive.create_indexes([
+            IndexModel(SHARD_KEY),
+            IndexModel([("gym_id", ASCENDING), ("member_id", ASCENDING), ("class_start_time", ASCENDING)]),
+            IndexModel([("gym_id", ASCENDING), ("class_id", ASCENDING)]),
+            IndexModel([("gym_id", ASCENDING), ("member_id", ASCENDING), ("booking_time", DESCENDING), ("_id", DESCENDING)]),
+        ]),
+        db.feedback.create_indexes([
+            IndexModel(SHARD_KEY),
+            IndexModel([("gym_id", ASCENDING), ("trainer_id", ASCENDING), ("created_at", DESCENDING)]),
+            IndexModel([("gym_id", ASCENDING), ("member_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        ]),
+        db.notifications.create_indexes([
+            IndexModel(SHARD_KEY),
+            IndexModel([("gym_id", ASCENDING), ("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        ]),
+        db.member_stats.create_indexes([
+            IndexModel(SHARD_KEY),
+        ]),
+    )
+
+async def warm_up_mongo():
+    global replica_set_available, transactions_enabled
+    # Concurrent pings force the pool to open connections before the first request needs them
+    await asyncio.gather(*(db.command("ping") for _ in range(max(MONGO_MIN_POOL_SIZE, 1))))
+    replica_set_available = await detect_replica_set()
+    transactions_enabled = MONGO_TRANSACTIONS == 'true' or (MONGO_TRANSACTIONS == 'auto' and replica_set_available)
+    if MONGO_TRANSACTIONS == 'true' and not replica_set_available:
+        logger.warning("MONGO_TRANSACTIONS=true but MongoDB is not a replica set; transactional writes will fail")
+    await backfill_gym_ids()
+    await ensure_indexes()
+    await backfill_normalized_user_fields()
+
+async def backfill_gym_ids():
+    # Documents written before multi-site support; a no-op once backfilled
+    await asyncio.gather(*(
+        db[collection].update_many({"gym_id": {"$exists": False}}, {"$set": {"gym_id": DEFAULT_GYM_ID}})
+        for collection in GYM_SCOPED_COLLECTIONS
+    ))
+
+async def gym_ids() -> List[str]:
+    """Every location with users; scheduled jobs run site by site over these"""
+    return await db.users.distinct("gym_id")
+
+def in_gym(gym_id: str, query: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Scope a filter to one location; gym_id comes first as it does in every index"""
+    return {"gym_id": gym_id, **(query or {})}
+
+def normalized(text: str) -> str:
+    """Lower-cased copy stored beside searchable fields so prefix queries can use an index"""
+    return text.strip().lower()
+
+async def backfill_normalized_user_fields():
+    # Users created before the normalized fields existed; a no-op once backfilled
+    await db.users.update_many(
+        {"email_lower": {"$exists": False}},
+        [{"$set": {
+            "email_lower": {"$toLower": {"$trim": {"input": "$email"}}},
+            "full_name_lower": {"$toLower": {"$trim": {"input": "$full_name"}}}
+        }}]
+    )
+
+# Caches
+logger = logging.getLogger("supreme_fitness")
+
+_MISSING = object()
+
+class TTLCache:
+    """In-process cache whose entries expire after ttl seconds or on invalidation"""
+
+    def __init__(self, ttl: float, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: Dict[Any, tuple] = {}
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        value, expires = entry
+        if expires < time.monotonic():
+            self.entries.pop(key, None)
+            return default
+        return value
+
+    def set(self, key, value):
+        if len(self.entries) >= self.max_entries:
+            self.entries.clear()
+        self.entries[key] = (value, time.monotonic() + self.ttl)
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None"""
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+class AutocompleteIndex:
+    """Sorted prefix index over one location's class and trainer names, rebuilt lazily after class writes"""
+
+    def __init__(self, gym_id: str):
+        self.gym_id = gym_id
+        self.keys: List[str] = []
+        self.texts: List[str] = []
+        self.counts: Dict[str, int] = {}
+        self.stale = True
+        self.lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.stale = True
+
+    def build(self, texts: List[str]):
+        counts: Dict[str, int] = {}
+        for text in texts:
+            counts[text] = counts.get(text, 0) + 1
+        # Every word suffix of a name is a key, so "yo" and "morning yo" both hit "Morning Yoga"
+        entries = set()
+        for text in counts:
+            words = re.findall(r"\w+", text.lower())
+            for i in range(len(words)):
+                entries.add((" ".join(words[i:]), text))
+        entries = sorted(entries)
+        self.keys = [key for key, _ in entries]
+        self.texts = [text for _, text in entries]
+        self.counts = counts
+
+    async def refresh(self):
+        if not self.stale:
+            return
+        async with self.lock:
+            if not self.stale:
+                return
+            # Cleared before reading so a write during the rebuild marks it stale again
+            self.stale = False
+            try:
+                # From the primary: a lagging secondary would cache pre-write names until the next write
+                classes = await db.classes.find(
+                    in_gym(self.gym_id, {"status": ClassStatus.ACTIVE}), {"name": 1, "trainer_name": 1, "_id": 0}
+                ).to_list(length=None)
+            except Exception:
+                self.stale = True
+                raise
+            self.build([cls[field] for cls in classes for field in ("name", "trainer_name")])
+
+    def suggest(self, prefix: str, limit: int) -> List[str]:
+        prefix = " ".join(re.findall(r"\w+", prefix.lower()))
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + "\uffff", lo=start)
+        matches = set(self.texts[start:end])
+        return sorted(matches, key=lambda text: (-self.counts[text], text))[:limit]
+
+principal_cache = TTLCache(CACHE_TTL_SECONDS)
+class_schedule_cache = TTLCache(CACHE_TTL_SECONDS)
+stats_cache = TTLCache(CACHE_TTL_SECONDS)
+class_autocomplete: Dict[str, AutocompleteIndex] = {}
+
+def autocomplete_index(gym_id: str) -> AutocompleteIndex:
+    if gym_id not in class_autocomplete:
+        class_autocomplete[gym_id] = AutocompleteIndex(gym_id)
+    return class_autocomplete[gym_id]
+
+WATCHED_COLLECTIONS = ["users", "classes", "bookings", "payments"]
+
+def invalidate_caches(collection: str, user_id: Optional[str] = None, gym_id: Optional[str] = None):
+    """Drop cached data derived from collection; user_id narrows principal invalidation and
+    gym_id narrows the per-location caches (None clears every location)"""
+    if collection == "users":
+        principal_cache.invalidate(user_id)
+    if collection in ("classes", "bookings"):
+        class_schedule_cache.invalidate(gym_id)
+    if collection == "classes":
+        for index in class_autocomplete.values() if gym_id is None else [autocomplete_index(gym_id)]:
+            index.invalidate()
+    stats_cache.invalidate(gym_id)
+
+async def watch_cache_invalidations():
+    """Apply writes made by any worker to this worker's caches via a database change stream"""
+    pipeline = [{"$match": {"ns.coll": {"$in": WATCHED_COLLECTIONS}}}]
+    resume_token = None
+    while True:
+        try:
+            async with db.watch(pipeline, full_document="updateLookup", resume_after=resume_token) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    document_key = change.get("documentKey", {})
+                    document_id = document_key.get("_id")
+                    # Sharded collections carry gym_id in the document key, so deletes are scoped too
+                    gym_id = document_key.get("gym_id") or (change.get("fullDocument") or {}).get("gym_id")
+                    invalidate_caches(change["ns"]["coll"], str(document_id) if document_id else None, gym_id)
+        except asyncio.CancelledError:
+            raise
+        except PyMongoError as exc:
+            # Events may have been missed (or the token expired), so start clean
+            logger.warning("Cache invalidation stream failed: %s", exc)
+            resume_token = None
+            for collection in WATCHED_COLLECTIONS:
+                invalidate_caches(collection)
+            await asyncio.sleep(5)
+
+# Scheduler
+scheduler_metrics: Dict[str, Dict[str, Any]] = {}
+
+async def acquire_lease(name: str, lease_seconds: float) -> bool:
+    """Take or renew the named lease for this worker; False while another worker holds it"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.leases.find_one_and_update(
+            {"_id": name, "$or": [{"owner": WORKER_ID}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": WORKER_ID, "expires_at": now + timedelta(seconds=lease_seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The upsert lost to a live lease held by someone else
+        return False
+    return True
+
+async def run_periodic(name: str, job, interval: float):
+    """Run job every interval seconds (with jitter) on whichever worker holds the lease"""
+    metrics = scheduler_metrics.setdefault(name, {
+        "is_leader": False,
+        "runs": 0,
+        "errors": 0,
+        "last_run_at": None,
+        "last_duration_ms": None,
+        "max_duration_ms": 0.0,
+        "last_result": None,
+    })
+    # Spread first runs so restarted workers do not all hit Mongo at once
+    await asyncio.sleep(random.uniform(0, min(interval, 30)))
+    while True:
+        try:
+            metrics["is_leader"] = await acquire_lease(name, interval * 2)
+            if metrics["is_leader"]:
+                started = time.monotonic()
+                metrics["last_result"] = await job()
+                duration_ms = round((time.monotonic() - started) * 1000, 1)
+                metrics["runs"] += 1
+                metrics["last_run_at"] = datetime.now(timezone.utc)
+                metrics["last_duration_ms"] = duration_ms
+                metrics["max_duration_ms"] = max(metrics["max_duration_ms"], duration_ms)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            metrics["errors"] += 1
+            logger.exception("Scheduled job %s failed", name)
+        await asyncio.sleep(interval * random.uniform(0.9, 1.1))
+
+# Scheduled jobs
+async def complete_ended_classes() -> Dict[str, int]:
+    """Mark ended classes completed and their unchecked bookings as no-shows, in batches per location"""
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=LIFECYCLE_GRACE_MINUTES)
+    completed = no_shows = 0
+    for gym_id in await gym_ids():
+        while True:
+            ended = await db.classes.find(
+                in_gym(gym_id, {"status": ClassStatus.ACTIVE, "end_time": {"$lt": cutoff}}),
+                {"_id": 1}
+            ).limit(LIFECYCLE_BATCH_SIZE).to_list(length=LIFECYCLE_BATCH_SIZE)
+            if not ended:
+                break
+            class_ids = [str_id(cls) for cls in ended]
+            bookings_result = await db.bookings.update_many(
+                in_gym(gym_id, {"class_id": {"$in": class_ids}, "status": BookingStatus.BOOKED}),
+                {"$set": {"status": BookingStatus.NO_SHOW}}
+            )
+            # Classes last, so a crash mid-batch leaves them to be picked up again
+            classes_result = await db.classes.update_many(
+                in_gym(gym_id, {"_id": {"$in": as_uuids(class_ids)}, "status": ClassStatus.ACTIVE}),
+                {"$set": {"status": ClassStatus.COMPLETED}}
+            )
+            completed += classes_result.modified_count
+            no_shows += bookings_result.modified_count
+            if len(ended) < LIFECYCLE_BATCH_SIZE:
+                break
+    if completed:
+        invalidate_caches("classes")
+    return {"classes_completed": completed, "bookings_no_show": no_shows}
+
+ARCHIVED_COLLECTIONS = ["classes", "bookings"]
+
+def archive_horizon() -> datetime:
+    """Classes that ended before this may live in the archive collections"""
+    return datetime.now(timezone.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+async def copy_to_archive(collection: str, documents: List[Dict[str, Any]]):
+    if not documents:
+        return
+    try:
+        await db[f"{collection}_archive"].insert_many(documents, ordered=False)
+    except BulkWriteError as exc:
+        # Copies left by an interrupted run are already in place
+        if any(error["code"] != 11000 for error in exc.details["writeErrors"]):
+            raise
+
+async def archive_old_classes() -> Dict[str, int]:
+    """Move finished classes older than the horizon, with their bookings, to archive collections"""
+    cutoff = archive_horizon()
+    archived_classes = archived_bookings = 0
+    for gym_id in await gym_ids():
+        while True:
+            classes = await db.classes.find(in_gym(gym_id, {
+                "status": {"$in": [ClassStatus.COMPLETED, ClassStatus.CANCELLED]},
+                "end_time": {"$lt": cutoff}
+            })).limit(ARCHIVE_BATCH_SIZE).to_list(length=ARCHIVE_BATCH_SIZE)
+            if not classes:
+                break
+            class_ids = [str_id(cls) for cls in classes]
+            bookings = await db.bookings.find(in_gym(gym_id, {"class_id": {"$in": class_ids}})).to_list(length=None)
+            # Copy first and delete bookings before classes, so a crash only ever leaves duplicates
+            await copy_to_archive("classes", classes)
+            await copy_to_archive("bookings", bookings)
+            await db.bookings.delete_many(in_gym(gym_id, {"_id": {"$in": [booking["_id"] for booking in bookings]}}))
+            await db.classes.delete_many(in_gym(gym_id, {"_id": {"$in": [cls["_id"] for cls in classes]}}))
+            archived_classes += len(classes)
+            archived_bookings += len(bookings)
+            if len(classes) < ARCHIVE_BATCH_SIZE:
+                break
+    return {"classes_archived": archived_classes, "bookings_archived": archived_bookings}
+
+# Orders PayPal can still capture; failing their payment here would let a later capture flip it back
+CAPTURABLE_ORDER_STATUSES = {"CREATED", "SAVED", "APPROVED", "PAYER_ACTION_REQUIRED"}
+
+async def payment_verdict(payment: Dict[str, Any], expire_before: datetime) -> str:
+    """What a stale pending payment should become: completed, failed, pending or error"""
+    order_id = payment.get("paypal_order_id")
+    if PAYPAL_ENABLED and order_id:
+        try:
+            order_status = (await payment_gateway.get_order(order_id)).get("status")
+        except PaymentGatewayError as exc:
+            if exc.status_code != 404:
+                return "error"
+            order_status = "NOT_FOUND"
+        if order_status == "COMPLETED":
+            return "completed"
+        if order_status in ("VOIDED", "NOT_FOUND"):
+            return "failed"
+        if order_status in CAPTURABLE_ORDER_STATUSES:
+            # Never expired here: the job does not charge, and PayPal voids or drops them itself
+            return "pending"
+    # Without a PayPal order the checkout was abandoned once it is old enough
+    return "failed" if as_utc(payment["created_at"]) < expire_before else "pending"
+
+async def reconcile_pending_payments() -> Dict[str, Any]:
+    """Settle stale pending payments against PayPal, in created_at order, a batch at a time"""
+    started = time.monotonic()
+    now = datetime.now(timezone.utc)
+    stale_before = now - timedelta(minutes=RECONCILE_STALE_MINUTES)
+    expire_before = now - timedelta(hours=RECONCILE_EXPIRE_HOURS)
+    checks = asyncio.Semaphore(RECONCILE_CONCURRENCY)
+    counts = {"checked": 0, "completed": 0, "failed": 0, "pending": 0, "error": 0}
+
+    async def check(payment):
+        async with checks:
+            return payment, await payment_verdict(payment, expire_before)
+
+    for gym_id in await gym_ids():
+        last = None
+        while True:
+            # Keyset paging: payments left pending must not be read again in this run
+            query = in_gym(gym_id, {"status": PaymentStatus.PENDING, "created_at": {"$lt": stale_before}})
+            if last:
+                query["$or"] = [{"created_at": {"$gt": last[0]}}, {"created_at": last[0], "_id": {"$gt": last[1]}}]
+            batch = await db.payments.find(query).sort(
+                [("created_at", ASCENDING), ("_id", ASCENDING)]
+            ).limit(RECONCILE_BATCH_SIZE).to_list(length=RECONCILE_BATCH_SIZE)
+            if not batch:
+                break
+            last = (batch[-1]["created_at"], batch[-1]["_id"])
+            
+            verdicts = await asyncio.gather(*(check(payment) for payment in batch))
+            counts["checked"] += len(batch)
+            failed = [
+                UpdateOne(
+                    in_gym(gym_id, {"_id": payment["_id"], "status": PaymentStatus.PENDING}),
+                    {"$set": {"status": PaymentStatus.FAILED}}
+                )
+                for payment, verdict in verdicts if verdict == "failed"
+            ]
+            if failed:
+                result = await db.payments.bulk_write(failed, ordered=False)
+                counts["failed"] += result.modified_count
+            for verdict in ("pending", "error"):
+                counts[verdict] += sum(1 for _, v in verdicts if v == verdict)
+            
+            # Captured at PayPal but never completed here: rare, and each one touches stats and a booking
+            paid = [payment for payment, verdict in verdicts if verdict == "completed"]
+            completed_user_ids = []
+            for payment in paid:
+                if await mark_payment_completed(payment, payment["paypal_order_id"]):
+                    completed_user_ids.append(payment["user_id"])
+            if completed_user_ids:
+                logger.warning("Reconciled %d payments captured at PayPal but pending locally", len(completed_user_ids))
+                counts["completed"] += len(completed_user_ids)
+                await create_notifications(
+                    gym_id, completed_user_ids, "Payment Successful", "Your payment has been confirmed", "payment"
+                )
+            if len(batch) < RECONCILE_BATCH_SIZE:
+                break
+    
+    if counts["completed"] or counts["failed"]:
+        invalidate_caches("payments")
+    elapsed = time.monotonic() - started
+    counts["mismatches"] = counts["completed"]
+    counts["payments_per_second"] = round(counts["checked"] / max(elapsed, 1e-9), 1)
+    return counts
+
+def cursors_including_archive(database, collection: str, query: Dict[str, Any], start: Optional[datetime]) -> list:
+    """Hot cursor, plus an archive cursor when the requested range reaches past the horizon"""
+    cursors = [database[collection].find(query)]
+    if start is not None and as_utc(start) < archive_horizon():
+        cursors.append(database[f"{collection}_archive"].find(query))
+    return cursors
+
+async def find_including_archive(database, collection: str, query: Dict[str, Any], start: Optional[datetime]) -> List[Dict[str, Any]]:
+    documents = []
+    for cursor in cursors_including_archive(database, collection, query, start):
+        documents += await cursor.to_list(length=None)
+    return documents
+
+# NDJSON streaming for list endpoints
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NDJSON_BATCH_SIZE = 500
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+async def ndjson_models(model, cursors: list):
+    """Serialize documents as they come off the cursors; each yield waits for the socket to drain"""
+    for cursor in cursors:
+        lines = []
+        async for document in cursor.batch_size(NDJSON_BATCH_SIZE):
+            lines.append(model(**document).json())
+            if len(lines) == NDJSON_BATCH_SIZE:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+def ndjson_response(model, *cursors) -> StreamingResponse:
+    return StreamingResponse(ndjson_models(model, list(cursors)), media_type=NDJSON_MEDIA_TYPE)
+
+def time_range(field: str, start: Optional[datetime], end: Optional[datetime]) -> Dict[str, Any]:
+    if start is None and end is None:
+        return {}
+    bounds = {}
+    if start is not None:
+        bounds["$gte"] = start
+    if end is not None:
+        bounds["$lt"] = end
+    return {field: bounds}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    connect_mongo()
+    await warm_up_mongo()
+    background_tasks = []
+    if CACHE_INVALIDATION_STREAM and replica_set_available:
+        background_tasks.append(asyncio.create_task(watch_cache_invalidations()))
+    elif CACHE_INVALIDATION_STREAM:
+        logger.warning("Change streams need a replica set; caches rely on their %ss TTL across workers", CACHE_TTL_SECONDS)
+    if SCHEDULER_ENABLED:
+        background_tasks.append(asyncio.create_task(
+            run_periodic("class_lifecycle", complete_ended_classes, LIFECYCLE_INTERVAL_SECONDS)
+        ))
+        background_tasks.append(asyncio.create_task(
+            run_periodic("archive", archive_old_classes, ARCHIVE_INTERVAL_SECONDS)
+        ))
+        background_tasks.append(asyncio.create_task(
+            run_periodic("payment_reconciliation", reconcile_pending_payments, RECONCILE_INTERVAL_SECONDS)
+        ))
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        # Let cancelled jobs unwind before the client they are writing through goes away
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        await payment_gateway.aclose()
+        close_mongo()
+
+# Load shedding
+# Lower numbers are admitted first; paths not listed get NORMAL_PRIORITY
+NORMAL_PRIORITY = 1
+ROUTE_PRIORITIES = [
+    ("/api/login", 0),
+    ("/api/register", 0),
+    ("/api/bookings", 0),
+    ("/api/payments", 0),
+    ("/api/analytics", 2),
+    ("/api/export", 2),
+]
+
+# Uploads hold a slot for as long as the body takes to arrive, which says nothing about service time
+UNTIMED_ROUTES = ["/api/progress/import"]
+
+def route_priority(path: str) -> int:
+    for prefix, priority in ROUTE_PRIORITIES:
+        if path.startswith(prefix):
+            return priority
+    return NORMAL_PRIORITY
 
-app = FastAPI(title="Supreme Fitness Gym API")
+class AdmissionController:
+    """Caps in-flight requests; waiters are admitted by priority and shed once they would wait too long"""
+
+    def __init__(self, max_in_flight: int, max_queued: int, latency_budget_ms: float):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.latency_budget = latency_budget_ms / 1000
+        self.in_flight = 0
+        self.waiters: List[tuple] = []  # heap of (priority, sequence, future)
+        self.sequence = itertools.count()
+        self.service_time = 0.05  # moving average of request duration in seconds
+        self.admitted = 0
+        self.queued = 0
+        self.shed: Dict[str, int] = {}
+
+    def estimated_wait(self, ahead: int) -> float:
+        return (ahead + 1) * self.service_time / self.max_in_flight
+
+    def reject(self, reason: str, priority: int, ahead: int) -> int:
+        key = f"{reason}:p{priority}"
+        self.shed[key] = self.shed.get(key, 0) + 1
+        return max(1, math.ceil(self.estimated_wait(ahead)))
+
+    async def acquire(self, priority: int) -> Optional[int]:
+        """None once a slot is held, otherwise the Retry-After seconds for a 503"""
+        if self.in_flight < self.max_in_flight and not self.waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return None
+        
+        # Timed-out and cancelled waiters linger until a release pops them; they hold no place in line
+        self.waiters = [waiter for waiter in self.waiters if not waiter[2].done()]
+        heapq.heapify(self.waiters)
+        ahead = sum(1 for waiter in self.waiters if waiter[0] <= priority)
+        if self.estimated_wait(ahead) > self.latency_budget:
+            return self.reject("latency_budget", priority, ahead)
+        if len(self.waiters) >= self.max_queued:
+            worst = max(self.waiters)
+            if worst[0] <= priority:
+                return self.reject("queue_full", priority, ahead)
+            # Make room by shedding the lowest-priority waiter
+            self.waiters.remove(worst)
+            heapq.heapify(self.waiters)
+            worst[2].set_result(False)
+        
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.sequence), future))
+        self.queued += 1
+        try:
+            await asyncio.wait({future}, timeout=self.latency_budget)
+        except asyncio.CancelledError:
+            # Client went away while queued; hand back a slot we may have just been given
+            if future.done() and future.result():
+                self.release(None)
+            future.cancel()
+            raise
+        if future.done() and future.result():
+            self.admitted += 1
+            return None
+        reason = "displaced" if future.done() else "timeout"
+        future.cancel()
+        return self.reject(reason, priority, ahead)
+
+    def release(self, duration: Optional[float]):
+        if duration is not None:
+            self.service_time = 0.9 * self.service_time + 0.1 * duration
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                # The slot passes straight to the waiter, so in_flight stays the same
+                future.set_result(True)
+                return
+        self.in_flight -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "queued_now": sum(1 for waiter in self.waiters if not waiter[2].done()),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": dict(self.shed),
+            "shed_total": sum(self.shed.values()),
+            "avg_service_ms": round(self.service_time * 1000, 1),
+        }
+
+class LoadSheddingMiddleware:
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        retry_after = await self.controller.acquire(route_priority(scope["path"]))
+        if retry_after is not None:
+            response = JSONResponse(
+                {"detail": "Server is overloaded, please retry"},
+                status_code=503,
+                headers={"Retry-After": str(retry_after)}
+            )
+            return await response(scope, receive, send)
+        
+        # Time to the response start, so streamed exports and NDJSON listings don't inflate the estimate
+        started = time.monotonic()
+        responded_at = None
+        
+        async def send_timed(message):
+            nonlocal responded_at
+            if message["type"] == "http.response.start":
+                responded_at = time.monotonic()
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            timed = responded_at is not None and not scope["path"].startswith(tuple(UNTIMED_ROUTES))
+            self.controller.release(responded_at - started if timed else None)
+
+admission_controller = AdmissionController(MAX_IN_FLIGHT_REQUESTS, MAX_QUEUED_REQUESTS, QUEUE_LATENCY_BUDGET_MS)
+
+app = FastAPI(title="Supreme Fitness Gym API", lifespan=lifespan)
+
+# Added before CORS so shed responses still carry CORS headers
+app.add_middleware(LoadSheddingMiddleware, controller=admission_controller)
 
 # CORS middleware
 app.add_middleware(
@@ -31,12 +932,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor"],
 )
 
-# MongoDB connection
-client = AsyncIOMotorClient(MONGO_URL)
-db = client.supreme_fitness
-
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
@@ -52,12 +950,21 @@ class ClassStatus(str, Enum):
     CANCELLED = "cancelled"
     COMPLETED = "completed"
 
+class RecurrenceFrequency(str, Enum):
+    DAILY = "daily"
+    WEEKLY = "weekly"
+
 class BookingStatus(str, Enum):
     BOOKED = "booked"
     CANCELLED = "cancelled"
     ATTENDED = "attended"
     NO_SHOW = "no_show"
 
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+    PARQUET = "parquet"
+
 class PaymentStatus(str, Enum):
     PENDING = "pending"
     COMPLETED = "completed"
@@ -65,8 +972,22 @@ class PaymentStatus(str, Enum):
     REFUNDED = "refunded"
 
 # Pydantic Models
-class UserBase(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class StoredModel(BaseModel):
+    """Stored models keep their UUID id in Mongo's _id as a BSON binary UUID, scoped to a location"""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()), validation_alias=AliasChoices("id", "_id"))
+    gym_id: str = DEFAULT_GYM_ID
+
+    @field_validator("id", mode="before")
+    @classmethod
+    def _stringify_id(cls, value):
+        return str(value) if isinstance(value, uuid.UUID) else value
+
+    def to_document(self) -> Dict[str, Any]:
+        document = self.dict(exclude_none=True)
+        document["_id"] = uuid.UUID(document.pop("id"))
+        return document
+
+class UserBase(StoredModel):
     email: str
     full_name: str
     role: UserRole
@@ -81,18 +1002,37 @@ class UserCreate(BaseModel):
     full_name: str
     role: UserRole
     phone: Optional[str] = None
+    gym_id: str = DEFAULT_GYM_ID
+
+    @field_validator("gym_id")
+    @classmethod
+    def _known_gym(cls, value):
+        if value not in GYM_IDS:
+            raise ValueError(f"Unknown location; expected one of {', '.join(sorted(GYM_IDS))}")
+        return value
 
 class UserLogin(BaseModel):
     email: str
     password: str
 
+class BulkUserAction(str, Enum):
+    APPROVE = "approve"
+    DEACTIVATE = "deactivate"
+    REACTIVATE = "reactivate"
+
+class BulkUserRequest(BaseModel):
+    # Either explicit ids or a filter on role/approval/active status
+    user_ids: Optional[List[str]] = None
+    role: Optional[UserRole] = None
+    is_approved: Optional[bool] = None
+    is_active: Optional[bool] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
     user: UserBase
 
-class GymClass(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class GymClass(StoredModel):
     name: str
     description: str
     trainer_id: str
@@ -104,6 +1044,7 @@ class GymClass(BaseModel):
     price: float
     status: ClassStatus = ClassStatus.ACTIVE
     enrolled_count: int = 0
+    series_id: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ClassCreate(BaseModel):
@@ -115,10 +1056,23 @@ class ClassCreate(BaseModel):
     capacity: int
     price: float
 
-class Booking(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class ClassSeriesCreate(ClassCreate):
+    # start_time/end_time describe the first occurrence
+    frequency: RecurrenceFrequency = RecurrenceFrequency.WEEKLY
+    interval: int = Field(default=1, ge=1)
+    weekdays: Optional[List[int]] = None  # 0=Monday; weekly only, defaults to the first occurrence's day
+    until: datetime
+    exceptions: List[date] = []
+
+class ClassSeriesUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    capacity: Optional[int] = None
+    price: Optional[float] = None
+
+class Booking(StoredModel):
     member_id: str
-    member_name: str
+    member_name: Optional[str] = None  # not stored; filled in for rosters
     class_id: str
     class_name: str
     class_start_time: datetime
@@ -126,12 +1080,15 @@ class Booking(BaseModel):
     status: BookingStatus = BookingStatus.BOOKED
     payment_status: PaymentStatus = PaymentStatus.PENDING
     payment_id: Optional[str] = None
+    checked_in_at: Optional[datetime] = None
 
 class BookingCreate(BaseModel):
     class_id: str
 
-class Payment(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class CheckInRequest(BaseModel):
+    member_ids: List[str]
+
+class Payment(StoredModel):
     user_id: str
     booking_id: Optional[str] = None
     amount: float
@@ -141,8 +1098,7 @@ class Payment(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     completed_at: Optional[datetime] = None
 
-class Progress(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class Progress(StoredModel):
     member_id: str
     weight: Optional[float] = None
     height: Optional[float] = None  # in cm
@@ -150,12 +1106,28 @@ class Progress(BaseModel):
     attendance_count: int = 0
     recorded_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class MemberStats(BaseModel):
+    member_id: str
+    gym_id: str = DEFAULT_GYM_ID
+    classes_booked: int = 0
+    classes_cancelled: int = 0
+    attendance_count: int = 0
+    payments_count: int = 0
+    total_spent: float = 0
+    progress_entries: int = 0
+    last_booked_at: Optional[datetime] = None
+    last_attended_at: Optional[datetime] = None
+    last_progress_at: Optional[datetime] = None
+    latest_weight: Optional[float] = None
+    latest_height: Optional[float] = None
+    latest_bmi: Optional[float] = None
+    updated_at: Optional[datetime] = None
+
 class ProgressUpdate(BaseModel):
     weight: Optional[float] = None
     height: Optional[float] = None
 
-class Feedback(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class Feedback(StoredModel):
     member_id: str
     member_name: str
     trainer_id: Optional[str] = None
@@ -172,8 +1144,7 @@ class FeedbackCreate(BaseModel):
     comment: str
     feedback_type: str
 
-class Notification(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class Notification(StoredModel):
     user_id: str
     title: str
     message: str
@@ -181,6 +1152,77 @@ class Notification(BaseModel):
     is_read: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+# Rate limiting
+class TokenBucketLimiter:
+    """In-process token buckets keyed by an arbitrary string (email, client IP)"""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = 100_000):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: Dict[str, tuple] = {}
+
+    def acquire(self, key: str) -> float:
+        """Take a token for key; returns 0 when allowed, else seconds until a token is available"""
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            self.buckets[key] = (tokens - 1, now)
+            wait = 0.0
+        else:
+            self.buckets[key] = (tokens, now)
+            wait = (1 - tokens) / self.rate
+        if len(self.buckets) > self.max_keys:
+            self._prune(now)
+        return wait
+
+    def _prune(self, now: float):
+        # Buckets that have refilled completely carry no state worth keeping
+        refill_time = self.burst / self.rate
+        self.buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self.buckets.items()
+            if now - updated < refill_time
+        }
+
+def worker_share(total: float) -> float:
+    """This worker's part of a server-wide limit; each of the WEB_CONCURRENCY workers enforces one"""
+    return total / max(WEB_CONCURRENCY, 1)
+
+login_email_limiter = TokenBucketLimiter(worker_share(LOGIN_EMAIL_RATE_PER_MINUTE), max(1, int(worker_share(LOGIN_EMAIL_BURST))))
+login_ip_limiter = TokenBucketLimiter(worker_share(LOGIN_IP_RATE_PER_MINUTE), max(1, int(worker_share(LOGIN_IP_BURST))))
+# Caps the CPU spent on bcrypt; requests beyond it are rejected rather than queued
+password_check_slots = asyncio.Semaphore(max(1, int(worker_share(MAX_CONCURRENT_PASSWORD_CHECKS))))
+
+def client_ip(request: Request) -> str:
+    forwarded = request.headers.get("x-forwarded-for")
+    if TRUST_FORWARDED_FOR and forwarded:
+        # Entries left of the ones our proxies appended are client-supplied and may be forged
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        if hops:
+            return hops[-min(TRUSTED_PROXY_HOPS, len(hops))]
+    return request.client.host if request.client else "unknown"
+
+def enforce_login_rate_limit(email: str, ip: str):
+    wait = max(login_email_limiter.acquire(email.lower()), login_ip_limiter.acquire(ip))
+    if wait > 0:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
+
+async def run_password_work(func, *args):
+    """Run a bcrypt call off the event loop, shedding load once all slots are busy"""
+    if password_check_slots.locked():
+        raise HTTPException(
+            status_code=503,
+            detail="Authentication service busy",
+            headers={"Retry-After": "1"}
+        )
+    async with password_check_slots:
+        return await asyncio.to_thread(func, *args)
+
 # Helper functions
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -198,10 +1240,32 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def as_uuid(value: str):
+    """Query value for _id; strings that are not UUIDs are passed through and match nothing"""
+    try:
+        return uuid.UUID(value)
+    except (ValueError, TypeError, AttributeError):
+        return value
+
+def as_uuids(values: List[str]) -> list:
+    return [as_uuid(value) for value in values]
+
+def str_id(document: Dict[str, Any]) -> str:
+    return str(document["_id"])
+
+def as_utc(value: datetime) -> datetime:
+    """Mongo hands back naive UTC datetimes; make them comparable with aware ones"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
 def calculate_bmi(weight: float, height: float) -> float:
     height_m = height / 100  # Convert cm to meters
     return round(weight / (height_m ** 2), 2)
 
+def calculate_bmi_array(weight: np.ndarray, height: np.ndarray) -> np.ndarray:
+    """Vectorized calculate_bmi; NaN wherever either input is missing"""
+    height_m = height / 100
+    return np.round(weight / (height_m ** 2), 2)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
@@ -212,19 +1276,171 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user = await db.users.find_one({"id": user_id})
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    
+    user = await db.users.find_one({"_id": as_uuid(user_id)})
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
-    return UserBase(**user)
+    principal = UserBase(**user)
+    principal_cache.set(user_id, principal)
+    return principal
 
-async def create_notification(user_id: str, title: str, message: str, notification_type: str):
+async def create_notification(gym_id: str, user_id: str, title: str, message: str, notification_type: str):
     notification = Notification(
+        gym_id=gym_id,
         user_id=user_id,
         title=title,
         message=message,
         type=notification_type
     )
-    await db.notifications.insert_one(notification.dict())
+    await db.notifications.insert_one(notification.to_document())
+
+async def create_notifications(gym_id: str, user_ids: List[str], title: str, message: str, notification_type: str):
+    """Send the same notification to many users of one location with one insert"""
+    if not user_ids:
+        return
+    notifications = [
+        Notification(gym_id=gym_id, user_id=user_id, title=title, message=message, type=notification_type).to_document()
+        for user_id in user_ids
+    ]
+    await db.notifications.insert_many(notifications, ordered=False)
+
+async def run_transaction(callback):
+    """Run callback(session) in a transaction, or with session=None when transactions are disabled"""
+    if not transactions_enabled:
+        return await callback(None)
+    async with await client.start_session() as session:
+        # with_transaction retries the callback on transient errors and the commit on unknown results
+        return await session.with_transaction(callback)
+
+async def apply_writes(writes, session=None):
+    """Await independent write coroutines; writes sharing a session must not overlap"""
+    if session is None:
+        return await asyncio.gather(*writes)
+    return [await write for write in writes]
+
+# Member stats: one document per member (_id = member UUID, plus gym_id for the shard key),
+# kept current by the writes that change it and rebuilt from source by rebuild_member_stats()
+def member_stats_update(inc: Optional[Dict[str, Any]] = None, latest: Optional[Dict[str, datetime]] = None) -> Dict[str, Any]:
+    update: Dict[str, Any] = {"$set": {"updated_at": datetime.now(timezone.utc)}}
+    if inc:
+        update["$inc"] = inc
+    if latest:
+        update["$max"] = latest
+    return update
+
+def member_stats_key(gym_id: str, member_id: str) -> Dict[str, Any]:
+    # Upserts into a sharded collection must carry the full shard key
+    return {"gym_id": gym_id, "_id": as_uuid(member_id)}
+
+async def update_member_stats(gym_id: str, member_id: str, inc=None, latest=None, session=None):
+    await db.member_stats.update_one(
+        member_stats_key(gym_id, member_id), member_stats_update(inc, latest), upsert=True, session=session
+    )
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def progress_stats_update(count: int, recorded_date: datetime, weight, height, bmi) -> list:
+    """Pipeline update counting progress entries; latest_* only move forward in recorded time"""
+    newer = {"$gte": [recorded_date, {"$ifNull": ["$last_progress_at", EPOCH]}]}
+    return [{"$set": {
+        "progress_entries": {"$add": [{"$ifNull": ["$progress_entries", 0]}, count]},
+        "latest_weight": {"$cond": [newer, weight, "$latest_weight"]},
+        "latest_height": {"$cond": [newer, height, "$latest_height"]},
+        "latest_bmi": {"$cond": [newer, bmi, "$latest_bmi"]},
+        "last_progress_at": {"$cond": [newer, recorded_date, "$last_progress_at"]},
+        "updated_at": "$$NOW",
+    }}]
+
+async def member_stats_for(gym_id: str, member_id: str) -> MemberStats:
+    document = await db.member_stats.find_one(member_stats_key(gym_id, member_id)) or {}
+    document.pop("_id", None)
+    document.pop("gym_id", None)
+    return MemberStats(member_id=member_id, gym_id=gym_id, **document)
+
+async def aggregate_by_member(collection: str, match: Dict[str, Any], group: Dict[str, Any], member_field: str = "member_id", pre: Optional[list] = None) -> Dict[str, Dict[str, Any]]:
+    pipeline = [{"$match": match}, *(pre or []), {"$group": {"_id": f"${member_field}", **group}}]
+    return {row["_id"]: row async for row in db[collection].aggregate(pipeline)}
+
+async def rebuild_member_stats(batch_size: int = 500) -> int:
+    """Recompute every member's stats document, location by location"""
+    rebuilt = 0
+    for gym_id in await gym_ids():
+        rebuilt += await rebuild_gym_member_stats(gym_id, batch_size)
+    return rebuilt
+
+async def rebuild_gym_member_stats(gym_id: str, batch_size: int) -> int:
+    """Recompute one location's member stats from bookings, payments and progress, in batches"""
+    rebuilt = 0
+    last_id = None
+    while True:
+        query: Dict[str, Any] = in_gym(gym_id, {"role": UserRole.MEMBER})
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        members = await db.users.find(query, {"_id": 1}).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not members:
+            break
+        last_id = members[-1]["_id"]
+        member_ids = [str_id(member) for member in members]
+        in_batch = {"$in": member_ids}
+        
+        booking_group = {
+            "booked": {"$sum": 1},
+            "cancelled": {"$sum": {"$cond": [{"$eq": ["$status", BookingStatus.CANCELLED]}, 1, 0]}},
+            "attended": {"$sum": {"$cond": [{"$eq": ["$status", BookingStatus.ATTENDED]}, 1, 0]}},
+            "last_booked_at": {"$max": "$booking_time"},
+            "last_attended_at": {"$max": "$checked_in_at"},
+        }
+        hot, archived, payments, progress = await asyncio.gather(
+            aggregate_by_member("bookings", in_gym(gym_id, {"member_id": in_batch}), booking_group),
+            aggregate_by_member("bookings_archive", in_gym(gym_id, {"member_id": in_batch}), booking_group),
+            aggregate_by_member(
+                "payments", in_gym(gym_id, {"user_id": in_batch, "status": PaymentStatus.COMPLETED}),
+                {"count": {"$sum": 1}, "total": {"$sum": "$amount"}}, member_field="user_id"
+            ),
+            aggregate_by_member(
+                "progress", in_gym(gym_id, {"member_id": in_batch}),
+                {
+                    "count": {"$sum": 1},
+                    "last_progress_at": {"$first": "$recorded_date"},
+                    "weight": {"$first": "$weight"},
+                    "height": {"$first": "$height"},
+                    "bmi": {"$first": "$bmi"},
+                },
+                pre=[{"$sort": {"member_id": 1, "recorded_date": -1}}]
+            ),
+        )
+        
+        now = datetime.now(timezone.utc)
+        replacements = []
+        for member_id in member_ids:
+            bookings = [row for row in (hot.get(member_id), archived.get(member_id)) if row]
+            payment = payments.get(member_id, {})
+            entry = progress.get(member_id, {})
+            stats = MemberStats(
+                member_id=member_id,
+                gym_id=gym_id,
+                classes_booked=sum(row["booked"] for row in bookings),
+                classes_cancelled=sum(row["cancelled"] for row in bookings),
+                attendance_count=sum(row["attended"] for row in bookings),
+                payments_count=payment.get("count", 0),
+                total_spent=payment.get("total", 0),
+                progress_entries=entry.get("count", 0),
+                last_booked_at=max((row["last_booked_at"] for row in bookings if row["last_booked_at"]), default=None),
+                last_attended_at=max((row["last_attended_at"] for row in bookings if row["last_attended_at"]), default=None),
+                last_progress_at=entry.get("last_progress_at"),
+                latest_weight=entry.get("weight"),
+                latest_height=entry.get("height"),
+                latest_bmi=entry.get("bmi"),
+                updated_at=now,
+            )
+            document = stats.dict(exclude={"member_id"}, exclude_none=True)
+            replacements.append(ReplaceOne(member_stats_key(gym_id, member_id), document, upsert=True))
+        await db.member_stats.bulk_write(replacements, ordered=False)
+        rebuilt += len(replacements)
+    return rebuilt
 
 # Auth endpoints
 @app.post("/api/register", response_model=UserBase)
@@ -235,26 +1451,31 @@ async def register(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await run_password_work(get_password_hash, user_data.password)
     user = UserBase(
         email=user_data.email,
         full_name=user_data.full_name,
         role=user_data.role,
         phone=user_data.phone,
+        gym_id=user_data.gym_id,
         is_approved=user_data.role in [UserRole.MEMBER, UserRole.ADMIN]  # Auto-approve members and admins
     )
     
-    user_dict = user.dict()
+    user_dict = user.to_document()
     user_dict["password"] = hashed_password
+    user_dict["email_lower"] = normalized(user.email)
+    user_dict["full_name_lower"] = normalized(user.full_name)
     
     await db.users.insert_one(user_dict)
+    invalidate_caches("users", user.id, user.gym_id)
     
     # Create notification for admin if trainer/staff registration
     if user_data.role in [UserRole.TRAINER]:
-        admin_users = await db.users.find({"role": UserRole.ADMIN}).to_list(length=None)
+        admin_users = await db.users.find(in_gym(user.gym_id, {"role": UserRole.ADMIN})).to_list(length=None)
         for admin in admin_users:
             await create_notification(
-                admin["id"],
+                user.gym_id,
+                str_id(admin),
                 "New Registration Pending",
                 f"New {user_data.role} registration: {user_data.full_name}",
                 "registration"
@@ -263,9 +1484,11 @@ async def register(user_data: UserCreate):
     return user
 
 @app.post("/api/login", response_model=Token)
-async def login(user_data: UserLogin):
+async def login(user_data: UserLogin, request: Request):
+    enforce_login_rate_limit(user_data.email, client_ip(request))
+    
     user = await db.users.find_one({"email": user_data.email})
-    if not user or not verify_password(user_data.password, user["password"]):
+    if not user or not await run_password_work(verify_password, user_data.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     if not user["is_active"]:
@@ -276,7 +1499,7 @@ async def login(user_data: UserLogin):
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user["id"]}, expires_delta=access_token_expires
+        data={"sub": str_id(user)}, expires_delta=access_token_expires
     )
     
     user_obj = UserBase(**user)
@@ -287,25 +1510,83 @@ async def login(user_data: UserLogin):
     )
 
 # User management endpoints
+def encode_user_cursor(full_name_lower: str, user_id: uuid.UUID) -> str:
+    raw = json.dumps({"name": full_name_lower, "id": str(user_id)})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_user_cursor(cursor: str) -> tuple:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(raw["name"]), uuid.UUID(raw["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def users_after(query: Dict[str, Any], cursor: str) -> Dict[str, Any]:
+    """Keyset condition on (full_name_lower, _id), the listing's sort order"""
+    name, user_id = decode_user_cursor(cursor)
+    after = {"$or": [{"full_name_lower": {"$gt": name}}, {"full_name_lower": name, "_id": {"$gt": user_id}}]}
+    return {"$and": [query, after]}
+
 @app.get("/api/users", response_model=List[UserBase])
-async def get_users(current_user: UserBase = Depends(get_current_user)):
+async def get_users(
+    request: Request,
+    response: Response,
+    role: Optional[UserRole] = None,
+    is_approved: Optional[bool] = None,
+    is_active: Optional[bool] = None,
+    q: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    current_user: UserBase = Depends(get_current_user)
+):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    users = await db.users.find().to_list(length=None)
-    return [UserBase(**user) for user in users]
+    query = in_gym(current_user.gym_id)
+    if role is not None:
+        query["role"] = role
+    if is_approved is not None:
+        query["is_approved"] = is_approved
+    if is_active is not None:
+        query["is_active"] = is_active
+    if q and normalized(q):
+        # Anchored regexes on the lower-cased fields turn into index range scans
+        prefix = {"$regex": "^" + re.escape(normalized(q))}
+        query["$or"] = [{"full_name_lower": prefix}, {"email_lower": prefix}]
+    
+    page_query = users_after(query, cursor) if cursor else query
+    sort = [("full_name_lower", 1), ("_id", 1)]
+    if wants_ndjson(request):
+        # Streaming has flat memory, so it returns the full listing past the cursor
+        return ndjson_response(UserBase, read_db.users.find(page_query, {"password": 0}).sort(sort))
+    
+    # One extra row tells whether another page follows without a second query
+    limit = max(1, min(limit, 500))
+    users = read_db.users.find(page_query, {"password": 0}).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+    if cursor:
+        users = await users
+    else:
+        # The count scans every match, so only the first page pays for it
+        total, users = await asyncio.gather(read_db.users.count_documents(query), users)
+        response.headers["X-Total-Count"] = str(total)
+    if len(users) > limit:
+        last = users[limit - 1]
+        response.headers["X-Next-Cursor"] = encode_user_cursor(last.get("full_name_lower", ""), last["_id"])
+    return [UserBase(**user) for user in users[:limit]]
 
 @app.put("/api/users/{user_id}/approve")
 async def approve_user(user_id: str, current_user: UserBase = Depends(get_current_user)):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    await db.users.update_one({"id": user_id}, {"$set": {"is_approved": True}})
+    await db.users.update_one(in_gym(current_user.gym_id, {"_id": as_uuid(user_id)}), {"$set": {"is_approved": True}})
+    invalidate_caches("users", user_id, current_user.gym_id)
     
     # Notify user
-    user = await db.users.find_one({"id": user_id})
+    user = await db.users.find_one(in_gym(current_user.gym_id, {"_id": as_uuid(user_id)}))
     if user:
         await create_notification(
+            current_user.gym_id,
             user_id,
             "Account Approved",
             "Your account has been approved. You can now access all features.",
@@ -319,9 +1600,78 @@ async def deactivate_user(user_id: str, current_user: UserBase = Depends(get_cur
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    await db.users.update_one({"id": user_id}, {"$set": {"is_active": False}})
+    await db.users.update_one(in_gym(current_user.gym_id, {"_id": as_uuid(user_id)}), {"$set": {"is_active": False}})
+    invalidate_caches("users", user_id, current_user.gym_id)
     return {"message": "User deactivated successfully"}
 
+MAX_BULK_USERS = 5000
+
+# field, value and optional notification (title, message, type) applied by each bulk action
+BULK_USER_ACTIONS = {
+    BulkUserAction.APPROVE: ("is_approved", True, (
+        "Account Approved",
+        "Your account has been approved. You can now access all features.",
+        "approval"
+    )),
+    BulkUserAction.DEACTIVATE: ("is_active", False, None),
+    BulkUserAction.REACTIVATE: ("is_active", True, (
+        "Account Reactivated",
+        "Your account has been reactivated.",
+        "account"
+    )),
+}
+
+@app.post("/api/users/bulk/{action}")
+async def bulk_update_users(action: BulkUserAction, request_data: BulkUserRequest, current_user: UserBase = Depends(get_current_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    query: Dict[str, Any] = {}
+    if request_data.user_ids is not None:
+        if len(request_data.user_ids) > MAX_BULK_USERS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_USERS} users per request")
+        query["_id"] = {"$in": as_uuids(request_data.user_ids)}
+    for field in ("role", "is_approved", "is_active"):
+        if getattr(request_data, field) is not None:
+            query[field] = getattr(request_data, field)
+    if not query:
+        raise HTTPException(status_code=400, detail="Provide user_ids or a filter")
+    
+    field, value, notification = BULK_USER_ACTIONS[action]
+    users = await db.users.find(in_gym(current_user.gym_id, query), {field: 1}).to_list(length=MAX_BULK_USERS + 1)
+    if len(users) > MAX_BULK_USERS:
+        raise HTTPException(status_code=400, detail=f"Filter matches more than {MAX_BULK_USERS} users")
+    
+    results: Dict[str, str] = {user_id: "not_found" for user_id in request_data.user_ids or []}
+    to_update = []
+    for user in users:
+        user_id = str_id(user)
+        if action == BulkUserAction.DEACTIVATE and user_id == current_user.id:
+            results[user_id] = "skipped"
+        elif user.get(field) == value:
+            results[user_id] = "unchanged"
+        else:
+            results[user_id] = "updated"
+            to_update.append(user_id)
+    
+    if to_update:
+        # The $ne guard keeps the write idempotent if another admin got there first
+        await db.users.bulk_write(
+            [
+                UpdateOne(in_gym(current_user.gym_id, {"_id": as_uuid(user_id), field: {"$ne": value}}), {"$set": {field: value}})
+                for user_id in to_update
+            ],
+            ordered=False
+        )
+        invalidate_caches("users", gym_id=current_user.gym_id)
+        if notification:
+            await create_notifications(current_user.gym_id, to_update, *notification)
+    
+    return {
+        "updated": len(to_update),
+        "results": [{"user_id": user_id, "status": result} for user_id, result in results.items()]
+    }
+
 # Class management endpoints
 @app.post("/api/classes", response_model=GymClass)
 async def create_class(class_data: ClassCreate, current_user: UserBase = Depends(get_current_user)):
@@ -329,11 +1679,12 @@ async def create_class(class_data: ClassCreate, current_user: UserBase = Depends
         raise HTTPException(status_code=403, detail="Trainer or Admin access required")
     
     # Get trainer info
-    trainer = await db.users.find_one({"id": class_data.trainer_id})
+    trainer = await db.users.find_one(in_gym(current_user.gym_id, {"_id": as_uuid(class_data.trainer_id)}))
     if not trainer:
         raise HTTPException(status_code=404, detail="Trainer not found")
     
     gym_class = GymClass(
+        gym_id=current_user.gym_id,
         name=class_data.name,
         description=class_data.description,
         trainer_id=class_data.trainer_id,
@@ -345,19 +1696,310 @@ async def create_class(class_data: ClassCreate, current_user: UserBase = Depends
         price=class_data.price
     )
     
-    await db.classes.insert_one(gym_class.dict())
+    await db.classes.insert_one(gym_class.to_document())
+    invalidate_caches("classes", gym_id=current_user.gym_id)
     return gym_class
 
+MAX_SERIES_OCCURRENCES = 366
+# Bounds the day-by-day walk however sparse the recurrence is
+MAX_SERIES_SPAN_DAYS = 2 * 366
+
+def expand_series(series: ClassSeriesCreate) -> List[tuple]:
+    """(start, end) pairs for every occurrence of a recurring series, skipping exceptions"""
+    # Mixed naive and aware inputs would not compare; naive ones are taken as UTC
+    first_start, first_end, until = as_utc(series.start_time), as_utc(series.end_time), as_utc(series.until)
+    if until - first_start > timedelta(days=MAX_SERIES_SPAN_DAYS):
+        raise HTTPException(status_code=400, detail=f"Series may span at most {MAX_SERIES_SPAN_DAYS} days")
+    duration = first_end - first_start
+    weekdays = set(series.weekdays or [first_start.weekday()])
+    skipped = set(series.exceptions)
+    occurrences = []
+    day = 0
+    while True:
+        start = first_start + timedelta(days=day)
+        if start > until:
+            break
+        if series.frequency == RecurrenceFrequency.DAILY:
+            matches = day % series.interval == 0
+        else:
+            # Weeks are counted from the Monday of the first occurrence's week
+            week = (day + first_start.weekday()) // 7
+            matches = week % series.interval == 0 and start.weekday() in weekdays
+        if matches and start.date() not in skipped:
+            occurrences.append((start, start + duration))
+            if len(occurrences) > MAX_SERIES_OCCURRENCES:
+                raise HTTPException(status_code=400, detail=f"Series exceeds {MAX_SERIES_OCCURRENCES} occurrences")
+        day += 1
+    return occurrences
+
+@app.post("/api/classes/series", response_model=List[GymClass])
+async def create_class_series(series_data: ClassSeriesCreate, current_user: UserBase = Depends(get_current_user)):
+    if current_user.role not in [UserRole.TRAINER, UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Trainer or Admin access required")
+    if as_utc(series_data.end_time) <= as_utc(series_data.start_time):
+        raise HTTPException(status_code=400, detail="end_time must be after start_time")
+    if any(day not in range(7) for day in series_data.weekdays or []):
+        raise HTTPException(status_code=400, detail="weekdays must be between 0 (Monday) and 6 (Sunday)")
+    
+    trainer = await db.users.find_one(in_gym(current_user.gym_id, {"_id": as_uuid(series_data.trainer_id)}))
+    if not trainer:
+        raise HTTPException(status_code=404, detail="Trainer not found")
+    
+    occurrences = expand_series(series_data)
+    if not occurrences:
+        raise HTTPException(status_code=400, detail="Series has no occurrences")
+    
+    # One range query over the trainer's schedule covers every occurrence
+    existing = await db.classes.find(
+        in_gym(current_user.gym_id, {
+            "trainer_id": series_data.trainer_id,
+            "status": ClassStatus.ACTIVE,
+            "start_time": {"$lt": occurrences[-1][1]},
+            "end_time": {"$gt": occurrences[0][0]}
+        }),
+        {"name": 1, "start_time": 1, "end_time": 1}
+    ).sort("start_time", 1).to_list(length=None)
+    conflicts = [
+        {"class_id": str_id(cls), "name": cls["name"], "start_time": cls["start_time"]}
+        for cls in existing
+        if any(
+            as_utc(start) < as_utc(cls["end_time"]) and as_utc(cls["start_time"]) < as_utc(end)
+            for start, end in occurrences
+        )
+    ]
+    if conflicts:
+        raise HTTPException(status_code=409, detail={"message": "Trainer has overlapping classes", "conflicts": conflicts})
+    
+    series_id = str(uuid.uuid4())
+    # From the normalised occurrence, as the raw start and end may mix naive and aware datetimes
+    first_start, first_end = occurrences[0]
+    duration = int((first_end - first_start).total_seconds() / 60)
+    classes = [
+        GymClass(
+            gym_id=current_user.gym_id,
+            name=series_data.name,
+            description=series_data.description,
+            trainer_id=series_data.trainer_id,
+            trainer_name=trainer["full_name"],
+            start_time=start,
+            end_time=end,
+            duration=duration,
+            capacity=series_data.capacity,
+            price=series_data.price,
+            series_id=series_id
+        )
+        for start, end in occurrences
+    ]
+    await db.classes.insert_many([gym_class.to_document() for gym_class in classes])
+    invalidate_caches("classes", gym_id=current_user.gym_id)
+    return classes
+
+async def get_owned_series(series_id: str, current_user: UserBase) -> Dict[str, Any]:
+    if current_user.role not in [UserRole.TRAINER, UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Trainer or Admin access required")
+    
+    first = await db.classes.find_one(in_gym(current_user.gym_id, {"series_id": series_id}), {"trainer_id": 1})
+    if not first:
+        raise HTTPException(status_code=404, detail="Series not found")
+    if current_user.role == UserRole.TRAINER and first["trainer_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return first
+
+def upcoming_series_query(gym_id: str, series_id: str) -> Dict[str, Any]:
+    # Past occurrences are history and are never edited in bulk
+    return in_gym(gym_id, {
+        "series_id": series_id,
+        "status": ClassStatus.ACTIVE,
+        "start_time": {"$gt": datetime.now(timezone.utc)}
+    })
+
+@app.put("/api/classes/series/{series_id}")
+async def update_class_series(series_id: str, update_data: ClassSeriesUpdate, current_user: UserBase = Depends(get_current_user)):
+    await get_owned_series(series_id, current_user)
+    
+    changes = update_data.dict(exclude_none=True)
+    if not changes:
+        raise HTTPException(status_code=400, detail="No changes provided")
+    
+    result = await db.classes.update_many(upcoming_series_query(current_user.gym_id, series_id), {"$set": changes})
+    invalidate_caches("classes", gym_id=current_user.gym_id)
+    return {"message": "Series updated successfully", "updated": result.modified_count}
+
+@app.put("/api/classes/series/{series_id}/cancel")
+async def cancel_class_series(series_id: str, current_user: UserBase = Depends(get_current_user)):
+    await get_owned_series(series_id, current_user)
+    
+    upcoming = await db.classes.find(upcoming_series_query(current_user.gym_id, series_id), {"_id": 1}).to_list(length=None)
+    class_ids = [str_id(cls) for cls in upcoming]
+    if not class_ids:
+        return {"message": "No upcoming classes in series", "cancelled": 0}
+    
+    booking_query = in_gym(current_user.gym_id, {"class_id": {"$in": class_ids}, "status": BookingStatus.BOOKED})
+    
+    async def cancel(session):
+        # Read inside the transaction so the counts match exactly the bookings flipped below
+        bookings = await db.bookings.find(
+            booking_query, {"class_id": 1, "member_id": 1}, session=session
+        ).to_list(length=None)
+        seats: Dict[str, int] = {}
+        cancelled: Dict[str, int] = {}
+        for booking in bookings:
+            seats[booking["class_id"]] = seats.get(booking["class_id"], 0) + 1
+            cancelled[booking["member_id"]] = cancelled.get(booking["member_id"], 0) + 1
+        
+        await db.classes.bulk_write(
+            [UpdateOne(
+                in_gym(current_user.gym_id, {"_id": as_uuid(class_id)}),
+                {"$set": {"status": ClassStatus.CANCELLED}, "$inc": {"enrolled_count": -seats.get(class_id, 0)}}
+            ) for class_id in class_ids],
+            ordered=False,
+            session=session
+        )
+        await db.bookings.update_many(
+            booking_query,
+            {"$set": {"status": BookingStatus.CANCELLED}},
+            session=session
+        )
+        if cancelled:
+            await db.member_stats.bulk_write(
+                [UpdateOne(
+                    member_stats_key(current_user.gym_id, member_id),
+                    member_stats_update({"classes_cancelled": count}),
+                    upsert=True
+                ) for member_id, count in cancelled.items()],
+                ordered=False,
+                session=session
+            )
+        return list(cancelled)
+
+    member_ids = await run_transaction(cancel)
+    invalidate_caches("classes", gym_id=current_user.gym_id)
+    
+    await create_notifications(
+        current_user.gym_id,
+        member_ids,
+        "Classes Cancelled",
+        "Upcoming classes you booked in a recurring series have been cancelled",
+        "class_update"
+    )
+    
+    return {"message": "Series cancelled successfully", "cancelled": len(class_ids)}
+
+@app.get("/api/classes/search", response_model=List[GymClass])
+async def search_classes(q: str, limit: int = 20, current_user: UserBase = Depends(get_current_user)):
+    limit = max(1, min(limit, 100))
+    classes = await read_db.classes.find(
+        # The text index is prefixed by gym_id, so $text needs the location as an equality match
+        in_gym(current_user.gym_id, {"$text": {"$search": q}, "status": ClassStatus.ACTIVE}),
+        {"score": {"$meta": "textScore"}}
+    ).sort([("score", {"$meta": "textScore"})]).limit(limit).to_list(length=limit)
+    return [GymClass(**cls) for cls in classes]
+
+@app.get("/api/classes/autocomplete")
+async def autocomplete_classes(q: str, limit: int = 10, current_user: UserBase = Depends(get_current_user)):
+    index = autocomplete_index(current_user.gym_id)
+    await index.refresh()
+    return {"suggestions": index.suggest(q, max(1, min(limit, 50)))}
+
 @app.get("/api/classes", response_model=List[GymClass])
 async def get_classes(current_user: UserBase = Depends(get_current_user)):
-    classes = await db.classes.find({"status": ClassStatus.ACTIVE}).to_list(length=None)
-    return [GymClass(**cls) for cls in classes]
+    schedule = class_schedule_cache.get(current_user.gym_id)
+    if schedule is None:
+        # Cached reads come from the primary, or a lagging secondary would pin a stale schedule for the TTL
+        classes = await db.classes.find(in_gym(current_user.gym_id, {"status": ClassStatus.ACTIVE})).to_list(length=None)
+        schedule = [GymClass(**cls) for cls in classes]
+        class_schedule_cache.set(current_user.gym_id, schedule)
+    return schedule
 
 @app.get("/api/classes/trainer/{trainer_id}", response_model=List[GymClass])
-async def get_trainer_classes(trainer_id: str, current_user: UserBase = Depends(get_current_user)):
-    classes = await db.classes.find({"trainer_id": trainer_id}).to_list(length=None)
+async def get_trainer_classes(
+    trainer_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: UserBase = Depends(get_current_user)
+):
+    query = in_gym(current_user.gym_id, {"trainer_id": trainer_id, **time_range("start_time", start, end)})
+    classes = await find_including_archive(read_db, "classes", query, start)
     return [GymClass(**cls) for cls in classes]
 
+async def get_class_for_staff(class_id: str, current_user: UserBase) -> Dict[str, Any]:
+    if current_user.role not in [UserRole.TRAINER, UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Trainer or Admin access required")
+    
+    gym_class = await db.classes.find_one(in_gym(current_user.gym_id, {"_id": as_uuid(class_id)}), {"trainer_id": 1, "name": 1})
+    if not gym_class:
+        raise HTTPException(status_code=404, detail="Class not found")
+    if current_user.role == UserRole.TRAINER and gym_class["trainer_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return gym_class
+
+ROSTER_STATUSES = [BookingStatus.BOOKED, BookingStatus.ATTENDED, BookingStatus.NO_SHOW]
+
+@app.get("/api/classes/{class_id}/roster", response_model=List[Booking])
+async def get_class_roster(class_id: str, current_user: UserBase = Depends(get_current_user)):
+    await get_class_for_staff(class_id, current_user)
+    
+    bookings = await db.bookings.find(
+        in_gym(current_user.gym_id, {"class_id": class_id, "status": {"$in": ROSTER_STATUSES}})
+    ).to_list(length=None)
+    # Bookings do not store member names; resolve the whole roster in one query
+    members = await db.users.find(
+        in_gym(current_user.gym_id, {"_id": {"$in": as_uuids([booking["member_id"] for booking in bookings])}}),
+        {"full_name": 1}
+    ).to_list(length=None)
+    names = {str_id(member): member["full_name"] for member in members}
+    roster = [Booking(**{**booking, "member_name": names.get(booking["member_id"])}) for booking in bookings]
+    return sorted(roster, key=lambda booking: booking.member_name or "")
+
+@app.post("/api/classes/{class_id}/check-in")
+async def check_in_members(class_id: str, check_in: CheckInRequest, current_user: UserBase = Depends(get_current_user)):
+    await get_class_for_staff(class_id, current_user)
+    
+    member_ids = list(dict.fromkeys(check_in.member_ids))
+    # Late check-ins may follow the lifecycle job marking the booking a no-show
+    checkable = [BookingStatus.BOOKED, BookingStatus.NO_SHOW]
+
+    async def check_in_all(session):
+        bookings = await db.bookings.find(
+            in_gym(current_user.gym_id, {"class_id": class_id, "member_id": {"$in": member_ids}, "status": {"$in": ROSTER_STATUSES}}),
+            {"member_id": 1, "status": 1},
+            session=session
+        ).to_list(length=None)
+        to_check_in = [booking for booking in bookings if booking["status"] in checkable]
+        if to_check_in:
+            now = datetime.now(timezone.utc)
+            await db.bookings.update_many(
+                in_gym(current_user.gym_id, {"_id": {"$in": [booking["_id"] for booking in to_check_in]}, "status": {"$in": checkable}}),
+                {"$set": {"status": BookingStatus.ATTENDED, "checked_in_at": now}},
+                session=session
+            )
+            await db.member_stats.bulk_write(
+                [
+                    UpdateOne(
+                        member_stats_key(current_user.gym_id, booking["member_id"]),
+                        member_stats_update({"attendance_count": 1}, {"last_attended_at": now}),
+                        upsert=True
+                    )
+                    for booking in to_check_in
+                ],
+                ordered=False,
+                session=session
+            )
+        return bookings, to_check_in
+
+    bookings, to_check_in = await run_transaction(check_in_all)
+    
+    results = {member_id: "not_booked" for member_id in member_ids}
+    for booking in bookings:
+        results[booking["member_id"]] = "already_checked_in"
+    for booking in to_check_in:
+        results[booking["member_id"]] = "checked_in"
+    
+    return {
+        "checked_in": len(to_check_in),
+        "results": [{"member_id": member_id, "status": result} for member_id, result in results.items()]
+    }
+
 # Booking endpoints
 @app.post("/api/bookings", response_model=Booking)
 async def create_booking(booking_data: BookingCreate, current_user: UserBase = Depends(get_current_user)):
@@ -365,7 +2007,7 @@ async def create_booking(booking_data: BookingCreate, current_user: UserBase = D
         raise HTTPException(status_code=403, detail="Member access required")
     
     # Get class info
-    gym_class = await db.classes.find_one({"id": booking_data.class_id})
+    gym_class = await db.classes.find_one(in_gym(current_user.gym_id, {"_id": as_uuid(booking_data.class_id)}))
     if not gym_class:
         raise HTTPException(status_code=404, detail="Class not found")
     
@@ -374,32 +2016,37 @@ async def create_booking(booking_data: BookingCreate, current_user: UserBase = D
         raise HTTPException(status_code=400, detail="Class is full")
     
     # Check if already booked
-    existing_booking = await db.bookings.find_one({
+    existing_booking = await db.bookings.find_one(in_gym(current_user.gym_id, {
         "member_id": current_user.id,
         "class_id": booking_data.class_id,
         "status": BookingStatus.BOOKED
-    })
+    }))
     if existing_booking:
         raise HTTPException(status_code=400, detail="Already booked for this class")
     
     booking = Booking(
+        gym_id=current_user.gym_id,
         member_id=current_user.id,
-        member_name=current_user.full_name,
         class_id=booking_data.class_id,
         class_name=gym_class["name"],
         class_start_time=gym_class["start_time"]
     )
     
-    await db.bookings.insert_one(booking.dict())
+    await db.bookings.insert_one(booking.to_document())
     
-    # Update class enrolled count
-    await db.classes.update_one(
-        {"id": booking_data.class_id},
-        {"$inc": {"enrolled_count": 1}}
+    # Update class enrolled count and member stats
+    await asyncio.gather(
+        db.classes.update_one(
+            in_gym(current_user.gym_id, {"_id": as_uuid(booking_data.class_id)}),
+            {"$inc": {"enrolled_count": 1}}
+        ),
+        update_member_stats(current_user.gym_id, current_user.id, {"classes_booked": 1}, {"last_booked_at": booking.booking_time})
     )
+    invalidate_caches("bookings", gym_id=current_user.gym_id)
     
     # Create notification
     await create_notification(
+        current_user.gym_id,
         current_user.id,
         "Booking Confirmed",
         f"Successfully booked {gym_class['name']} class",
@@ -409,35 +2056,55 @@ async def create_booking(booking_data: BookingCreate, current_user: UserBase = D
     return booking
 
 @app.get("/api/bookings/member", response_model=List[Booking])
-async def get_member_bookings(current_user: UserBase = Depends(get_current_user)):
+async def get_member_bookings(
+    request: Request,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: UserBase = Depends(get_current_user)
+):
     if current_user.role != UserRole.MEMBER:
         raise HTTPException(status_code=403, detail="Member access required")
     
-    bookings = await db.bookings.find({"member_id": current_user.id}).to_list(length=None)
+    query = in_gym(current_user.gym_id, {"member_id": current_user.id, **time_range("class_start_time", start, end)})
+    if wants_ndjson(request):
+        return ndjson_response(Booking, *cursors_including_archive(db, "bookings", query, start))
+    bookings = await find_including_archive(db, "bookings", query, start)
     return [Booking(**booking) for booking in bookings]
 
 @app.put("/api/bookings/{booking_id}/cancel")
 async def cancel_booking(booking_id: str, current_user: UserBase = Depends(get_current_user)):
-    booking = await db.bookings.find_one({"id": booking_id})
+    booking = await db.bookings.find_one(in_gym(current_user.gym_id, {"_id": as_uuid(booking_id)}))
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
     if booking["member_id"] != current_user.id and current_user.role not in [UserRole.TRAINER, UserRole.ADMIN]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    await db.bookings.update_one(
-        {"id": booking_id},
-        {"$set": {"status": BookingStatus.CANCELLED}}
-    )
-    
-    # Update class enrolled count
-    await db.classes.update_one(
-        {"id": booking["class_id"]},
-        {"$inc": {"enrolled_count": -1}}
-    )
+    async def cancel(session):
+        # Only the request that flips the status releases the seat, so retries never double-decrement
+        result = await db.bookings.update_one(
+            in_gym(current_user.gym_id, {"_id": as_uuid(booking_id), "status": BookingStatus.BOOKED}),
+            {"$set": {"status": BookingStatus.CANCELLED}},
+            session=session
+        )
+        if result.modified_count:
+            await apply_writes([
+                db.classes.update_one(
+                    in_gym(current_user.gym_id, {"_id": as_uuid(booking["class_id"])}),
+                    {"$inc": {"enrolled_count": -1}},
+                    session=session
+                ),
+                update_member_stats(current_user.gym_id, booking["member_id"], {"classes_cancelled": 1}, session=session)
+            ], session)
+        return result.modified_count
+
+    if not await run_transaction(cancel):
+        raise HTTPException(status_code=400, detail="Booking is not active")
+    invalidate_caches("bookings", gym_id=current_user.gym_id)
     
     # Create notification
     await create_notification(
+        current_user.gym_id,
         booking["member_id"],
         "Booking Cancelled",
         f"Your booking for {booking['class_name']} has been cancelled",
@@ -457,29 +2124,266 @@ async def create_progress_entry(progress_data: ProgressUpdate, current_user: Use
     if progress_data.weight and progress_data.height:
         bmi = calculate_bmi(progress_data.weight, progress_data.height)
     
-    # Get current attendance count
-    attended_bookings = await db.bookings.count_documents({
-        "member_id": current_user.id,
-        "status": BookingStatus.ATTENDED
-    })
+    # Attendance comes from the member stats document rather than a bookings scan
+    stats = await member_stats_for(current_user.gym_id, current_user.id)
     
     progress = Progress(
+        gym_id=current_user.gym_id,
         member_id=current_user.id,
         weight=progress_data.weight,
         height=progress_data.height,
         bmi=bmi,
-        attendance_count=attended_bookings
+        attendance_count=stats.attendance_count
     )
     
-    await db.progress.insert_one(progress.dict())
+    await asyncio.gather(
+        db.progress.insert_one(progress.to_document()),
+        db.member_stats.update_one(
+            member_stats_key(current_user.gym_id, current_user.id),
+            progress_stats_update(1, progress.recorded_date, progress.weight, progress.height, progress.bmi),
+            upsert=True
+        )
+    )
     return progress
 
+IMPORT_CHUNK_ROWS = 5000
+IMPORT_COLUMNS = ["member_id", "weight", "height", "recorded_date"]
+MAX_WEIGHT_KG = 500
+MAX_HEIGHT_CM = 300
+# Uploads beyond this spill from memory to a temporary file
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+# Body chunks are gathered up to this size before each (possibly disk-bound) write
+IMPORT_SPOOL_WRITE_BYTES = 1024 * 1024
+
+async def spool_request_body(request: Request):
+    """Copy the body to a spooled temp file; the response stream cannot read the body itself"""
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+    pending, pending_bytes = [], 0
+    async for chunk in request.stream():
+        pending.append(chunk)
+        pending_bytes += len(chunk)
+        if pending_bytes >= IMPORT_SPOOL_WRITE_BYTES:
+            # Past IMPORT_SPOOL_BYTES the writes hit the disk, so keep them off the event loop
+            await asyncio.to_thread(spool.write, b"".join(pending))
+            pending, pending_bytes = [], 0
+    await asyncio.to_thread(spool.write, b"".join(pending))
+    spool.seek(0)
+    return io.TextIOWrapper(spool, encoding="utf-8-sig", errors="replace", newline="")
+
+def import_rows(text, import_format: str):
+    """CSV records (quoted fields may span lines) or NDJSON lines from the spooled body"""
+    if import_format == "csv":
+        return csv.reader(text)
+    return (line.rstrip("\r\n") for line in text)
+
+def read_records(rows, count: int) -> list:
+    records = []
+    for record in rows:
+        # "".join covers both a CSV record's fields and an NDJSON line
+        if "".join(record).strip():
+            records.append(record)
+            if len(records) == count:
+                break
+    return records
+
+def parse_import_records(lines: List[tuple], import_format: str, header: Optional[List[str]]):
+    """(row, record) pairs and (row, error) pairs for one chunk of numbered CSV records or NDJSON lines"""
+    records, errors = [], []
+    for row, line in lines:
+        if import_format == "csv":
+            if len(line) != len(header):
+                errors.append((row, f"expected {len(header)} columns, got {len(line)}"))
+                continue
+            records.append((row, dict(zip(header, line))))
+        else:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                errors.append((row, "invalid JSON"))
+                continue
+            if not isinstance(record, dict):
+                errors.append((row, "expected a JSON object"))
+                continue
+            records.append((row, record))
+    return records, errors
+
+def validate_progress_records(records: List[tuple]):
+    """Validate a chunk and compute BMI column-wise; returns (valid columns, errors)"""
+    rows = np.array([row for row, _ in records])
+    frame = pd.DataFrame.from_records([record for _, record in records], columns=IMPORT_COLUMNS)
+    member_ids = frame["member_id"].astype("string").str.strip()
+    
+    def measurement(column: str, upper: float):
+        raw = frame[column]
+        given = raw.notna().to_numpy() & (raw.astype("string").str.strip() != "").fillna(False).to_numpy()
+        values = pd.to_numeric(raw, errors="coerce").to_numpy(dtype=float)
+        invalid = given & ~((values > 0) & (values <= upper))
+        return np.where(given & ~invalid, values, np.nan), invalid
+    
+    weight, bad_weight = measurement("weight", MAX_WEIGHT_KG)
+    height, bad_height = measurement("height", MAX_HEIGHT_CM)
+    recorded = pd.to_datetime(frame["recorded_date"], utc=True, errors="coerce", format="ISO8601")
+    
+    checks = [
+        (member_ids.isna().to_numpy() | (member_ids == "").fillna(True).to_numpy(), "member_id is required"),
+        (bad_weight, f"weight must be between 0 and {MAX_WEIGHT_KG} kg"),
+        (bad_height, f"height must be between 0 and {MAX_HEIGHT_CM} cm"),
+        (np.isnan(weight) & np.isnan(height), "weight or height is required"),
+        (recorded.isna().to_numpy(), "recorded_date must be an ISO 8601 date"),
+    ]
+    failed = np.zeros(len(rows), dtype=bool)
+    errors = []
+    for mask, message in checks:
+        new = mask & ~failed
+        errors.extend((int(row), message) for row in rows[new])
+        failed |= new
+    
+    valid = ~failed
+    return {
+        "rows": rows[valid],
+        "member_id": member_ids.to_numpy(dtype=object)[valid],
+        "weight": weight[valid],
+        "height": height[valid],
+        "bmi": calculate_bmi_array(weight[valid], height[valid]),
+        "recorded_date": [timestamp.to_pydatetime() for timestamp in recorded[valid]],
+    }, errors
+
+async def update_imported_progress_stats(gym_id: str, documents: List[Dict[str, Any]]):
+    """One stats update per member in the chunk: entry count plus the member's newest row"""
+    if not documents:
+        return
+    frame = pd.DataFrame.from_records(documents, columns=["member_id", "recorded_date", "weight", "height", "bmi"])
+    counts = frame.groupby("member_id").size()
+    latest = frame.loc[frame.groupby("member_id")["recorded_date"].idxmax()]
+    
+    def value(row, field):
+        return None if pd.isna(row[field]) else float(row[field])
+    
+    await db.member_stats.bulk_write(
+        [
+            UpdateOne(
+                member_stats_key(gym_id, row["member_id"]),
+                progress_stats_update(
+                    int(counts[row["member_id"]]), row["recorded_date"].to_pydatetime(),
+                    value(row, "weight"), value(row, "height"), value(row, "bmi")
+                ),
+                upsert=True
+            )
+            for _, row in latest.iterrows()
+        ],
+        ordered=False
+    )
+
+async def import_progress_chunk(gym_id: str, lines: List[tuple], import_format: str, header: Optional[List[str]]):
+    """Parse, validate and insert one chunk for members of gym_id; returns (inserted, errors)"""
+    records, errors = await asyncio.to_thread(parse_import_records, lines, import_format, header)
+    if not records:
+        return 0, errors
+    columns, invalid = await asyncio.to_thread(validate_progress_records, records)
+    errors += invalid
+    
+    known = await db.users.find(
+        in_gym(gym_id, {"_id": {"$in": as_uuids(list(set(columns["member_id"])))}, "role": UserRole.MEMBER}),
+        {"_id": 1}
+    ).to_list(length=None)
+    known_ids = {str_id(user) for user in known}
+    
+    documents, document_rows = [], []
+    for row, member_id, weight, height, bmi, recorded_date in zip(
+        columns["rows"], columns["member_id"], columns["weight"], columns["height"],
+        columns["bmi"], columns["recorded_date"]
+    ):
+        if member_id not in known_ids:
+            errors.append((int(row), "unknown member"))
+            continue
+        document = {
+            "_id": uuid.uuid4(), "gym_id": gym_id, "member_id": member_id,
+            "attendance_count": 0, "recorded_date": recorded_date
+        }
+        for field, value in (("weight", weight), ("height", height), ("bmi", bmi)):
+            if not np.isnan(value):
+                document[field] = float(value)
+        documents.append(document)
+        document_rows.append(int(row))
+    
+    inserted = len(documents)
+    if documents:
+        try:
+            await db.progress.insert_many(documents, ordered=False)
+        except BulkWriteError as exc:
+            inserted = exc.details["nInserted"]
+            failed = {error["index"] for error in exc.details["writeErrors"]}
+            errors.extend((document_rows[index], "write failed") for index in sorted(failed))
+            documents = [document for index, document in enumerate(documents) if index not in failed]
+        await update_imported_progress_stats(gym_id, documents)
+    return inserted, errors
+
+@app.post("/api/progress/import")
+async def import_progress(request: Request, current_user: UserBase = Depends(get_current_user)):
+    """Bulk import of historical measurements from a CSV or NDJSON request body.
+    
+    Streams back NDJSON: one {"row", "error"} line per rejected row, then a summary line."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        import_format = "csv"
+    elif "ndjson" in content_type or "jsonl" in content_type:
+        import_format = "ndjson"
+    else:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson")
+    
+    body = await spool_request_body(request)
+    rows = import_rows(body, import_format)
+    
+    async def results():
+        header = None
+        row = inserted = rejected = 0
+        try:
+            if import_format == "csv":
+                first = await asyncio.to_thread(read_records, rows, 1)
+                header = [column.strip() for column in first[0]] if first else []
+            while True:
+                lines = await asyncio.to_thread(read_records, rows, IMPORT_CHUNK_ROWS)
+                if not lines:
+                    break
+                chunk = [(row + offset + 1, line) for offset, line in enumerate(lines)]
+                row += len(lines)
+                chunk_inserted, errors = await import_progress_chunk(current_user.gym_id, chunk, import_format, header)
+                inserted += chunk_inserted
+                rejected += len(errors)
+                if errors:
+                    yield "".join(
+                        json.dumps({"row": error_row, "error": message}) + "\n"
+                        for error_row, message in sorted(errors)
+                    )
+        finally:
+            body.close()
+        yield json.dumps({"summary": {"rows": row, "inserted": inserted, "rejected": rejected}}) + "\n"
+    
+    return StreamingResponse(results(), media_type=NDJSON_MEDIA_TYPE)
+
+@app.get("/api/stats/member", response_model=MemberStats)
+async def get_my_stats(current_user: UserBase = Depends(get_current_user)):
+    if current_user.role != UserRole.MEMBER:
+        raise HTTPException(status_code=403, detail="Member access required")
+    
+    return await member_stats_for(current_user.gym_id, current_user.id)
+
+@app.get("/api/stats/member/{member_id}", response_model=MemberStats)
+async def get_member_stats(member_id: str, current_user: UserBase = Depends(get_current_user)):
+    if current_user.role not in [UserRole.TRAINER, UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Trainer or Admin access required")
+    
+    return await member_stats_for(current_user.gym_id, member_id)
+
 @app.get("/api/progress/member", response_model=List[Progress])
 async def get_member_progress(current_user: UserBase = Depends(get_current_user)):
     if current_user.role != UserRole.MEMBER:
         raise HTTPException(status_code=403, detail="Member access required")
     
-    progress_records = await db.progress.find({"member_id": current_user.id}).sort("recorded_date", -1).to_list(length=None)
+    progress_records = await db.progress.find(in_gym(current_user.gym_id, {"member_id": current_user.id})).sort("recorded_date", -1).to_list(length=None)
     return [Progress(**record) for record in progress_records]
 
 # Feedback endpoints
@@ -489,6 +2393,7 @@ async def create_feedback(feedback_data: FeedbackCreate, current_user: UserBase
         raise HTTPException(status_code=403, detail="Member access required")
     
     feedback = Feedback(
+        gym_id=current_user.gym_id,
         member_id=current_user.id,
         member_name=current_user.full_name,
         trainer_id=feedback_data.trainer_id,
@@ -498,11 +2403,12 @@ async def create_feedback(feedback_data: FeedbackCreate, current_user: UserBase
         feedback_type=feedback_data.feedback_type
     )
     
-    await db.feedback.insert_one(feedback.dict())
+    await db.feedback.insert_one(feedback.to_document())
     
     # Notify trainer if feedback is for them
     if feedback_data.trainer_id:
         await create_notification(
+            current_user.gym_id,
             feedback_data.trainer_id,
             "New Feedback Received",
             f"You received a {feedback_data.rating}-star rating from {current_user.full_name}",
@@ -512,65 +2418,85 @@ async def create_feedback(feedback_data: FeedbackCreate, current_user: UserBase
     return feedback
 
 @app.get("/api/feedback/trainer/{trainer_id}", response_model=List[Feedback])
-async def get_trainer_feedback(trainer_id: str, current_user: UserBase = Depends(get_current_user)):
-    feedback_records = await db.feedback.find({"trainer_id": trainer_id}).sort("created_at", -1).to_list(length=None)
+async def get_trainer_feedback(trainer_id: str, request: Request, current_user: UserBase = Depends(get_current_user)):
+    cursor = read_db.feedback.find(in_gym(current_user.gym_id, {"trainer_id": trainer_id})).sort("created_at", -1)
+    if wants_ndjson(request):
+        return ndjson_response(Feedback, cursor)
+    feedback_records = await cursor.to_list(length=None)
     return [Feedback(**record) for record in feedback_records]
 
 # Payment endpoints
 @app.post("/api/payments/create-order")
 async def create_payment_order(booking_id: str, current_user: UserBase = Depends(get_current_user)):
-    booking = await db.bookings.find_one({"id": booking_id})
+    booking = await db.bookings.find_one(in_gym(current_user.gym_id, {"_id": as_uuid(booking_id)}))
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
-    gym_class = await db.classes.find_one({"id": booking["class_id"]})
+    gym_class = await db.classes.find_one(in_gym(current_user.gym_id, {"_id": as_uuid(booking["class_id"])}))
     if not gym_class:
         raise HTTPException(status_code=404, detail="Class not found")
     
     # Create payment record
     payment = Payment(
+        gym_id=current_user.gym_id,
         user_id=current_user.id,
         booking_id=booking_id,
         amount=gym_class["price"],
         payment_type="class_booking"
     )
     
-    await db.payments.insert_one(payment.dict())
+    if PAYPAL_ENABLED:
+        try:
+            order = await payment_gateway.create_order(payment.id, payment.amount)
+        except PaymentGatewayError:
+            logger.exception("PayPal order creation failed for payment %s", payment.id)
+            raise HTTPException(status_code=502, detail="Payment provider unavailable")
+        payment.paypal_order_id = order["id"]
+    
+    await db.payments.insert_one(payment.to_document())
     
-    # Return PayPal order details (simplified for demo)
     return {
         "order_id": payment.id,
         "amount": payment.amount,
+        "paypal_order_id": payment.paypal_order_id,
         "paypal_client_id": PAYPAL_CLIENT_ID
     }
 
+async def capture_paypal_order(payment: dict, paypal_order_id: str) -> str:
+    """Capture the order created for this payment; returns the PayPal order id to record"""
+    stored_order_id = payment.get("paypal_order_id")
+    if not stored_order_id or paypal_order_id != stored_order_id:
+        raise HTTPException(status_code=400, detail="PayPal order does not match this payment")
+    try:
+        order = await payment_gateway.capture_order(stored_order_id)
+    except PaymentGatewayError as exc:
+        # A capture that already went through (e.g. a retried request) still completes the payment
+        if exc.status_code == 422 and "ORDER_ALREADY_CAPTURED" in str(exc.details):
+            return stored_order_id
+        if exc.status_code is not None and exc.status_code < 500:
+            raise HTTPException(status_code=402, detail="Payment was not approved")
+        logger.exception("PayPal capture failed for payment %s", payment["_id"])
+        raise HTTPException(status_code=502, detail="Payment provider unavailable")
+    if order.get("status") != "COMPLETED":
+        raise HTTPException(status_code=402, detail="Payment was not approved")
+    return stored_order_id
+
 @app.post("/api/payments/{payment_id}/complete")
 async def complete_payment(payment_id: str, paypal_order_id: str, current_user: UserBase = Depends(get_current_user)):
-    payment = await db.payments.find_one({"id": payment_id})
+    payment = await db.payments.find_one(in_gym(current_user.gym_id, {"_id": as_uuid(payment_id)}))
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
     
-    # Update payment status
-    await db.payments.update_one(
-        {"id": payment_id},
-        {
-            "$set": {
-                "status": PaymentStatus.COMPLETED,
-                "paypal_order_id": paypal_order_id,
-                "completed_at": datetime.now(timezone.utc)
-            }
-        }
-    )
+    if PAYPAL_ENABLED and payment["status"] != PaymentStatus.COMPLETED:
+        paypal_order_id = await capture_paypal_order(payment, paypal_order_id)
     
-    # Update booking payment status
-    if payment["booking_id"]:
-        await db.bookings.update_one(
-            {"id": payment["booking_id"]},
-            {"$set": {"payment_status": PaymentStatus.COMPLETED, "payment_id": payment_id}}
-        )
+    if not await mark_payment_completed(payment, paypal_order_id):
+        return {"message": "Payment already completed"}
+    invalidate_caches("payments", gym_id=current_user.gym_id)
     
     # Create notification
     await create_notification(
+        current_user.gym_id,
         current_user.id,
         "Payment Successful",
         f"Payment of ${payment['amount']} completed successfully",
@@ -579,45 +2505,354 @@ async def complete_payment(payment_id: str, paypal_order_id: str, current_user:
     
     return {"message": "Payment completed successfully"}
 
+async def mark_payment_completed(payment: Dict[str, Any], paypal_order_id: str) -> bool:
+    """Complete the payment, its booking and the member's stats; False if it was already completed"""
+    payment_id = str_id(payment)
+    gym_id = payment["gym_id"]
+
+    async def complete(session):
+        # Completing twice must not count the amount twice in member stats
+        result = await db.payments.update_one(
+            in_gym(gym_id, {"_id": payment["_id"], "status": {"$ne": PaymentStatus.COMPLETED}}),
+            {
+                "$set": {
+                    "status": PaymentStatus.COMPLETED,
+                    "paypal_order_id": paypal_order_id,
+                    "completed_at": datetime.now(timezone.utc)
+                }
+            },
+            session=session
+        )
+        if not result.modified_count:
+            return False
+        writes = [
+            update_member_stats(
+                gym_id, payment["user_id"], {"payments_count": 1, "total_spent": payment["amount"]}, session=session
+            )
+        ]
+        # Update booking payment status
+        if payment.get("booking_id"):
+            writes.append(db.bookings.update_one(
+                in_gym(gym_id, {"_id": as_uuid(payment["booking_id"])}),
+                {"$set": {"payment_status": PaymentStatus.COMPLETED, "payment_id": payment_id}},
+                session=session
+            ))
+        await apply_writes(writes, session)
+        return True
+
+    return await run_transaction(complete)
+
 # Notification endpoints
 @app.get("/api/notifications", response_model=List[Notification])
 async def get_notifications(current_user: UserBase = Depends(get_current_user)):
-    notifications = await db.notifications.find({"user_id": current_user.id}).sort("created_at", -1).to_list(length=None)
+    notifications = await db.notifications.find(in_gym(current_user.gym_id, {"user_id": current_user.id})).sort("created_at", -1).to_list(length=None)
     return [Notification(**notification) for notification in notifications]
 
 @app.put("/api/notifications/{notification_id}/read")
 async def mark_notification_read(notification_id: str, current_user: UserBase = Depends(get_current_user)):
     await db.notifications.update_one(
-        {"id": notification_id, "user_id": current_user.id},
+        in_gym(current_user.gym_id, {"_id": as_uuid(notification_id), "user_id": current_user.id}),
         {"$set": {"is_read": True}}
     )
     return {"message": "Notification marked as read"}
 
+# Timeline endpoint
+# type -> (collection, owner field, time field, model); each has a (gym, owner, time, _id) index
+TIMELINE_SOURCES = {
+    "booking": ("bookings", "member_id", "booking_time", Booking),
+    "archived_booking": ("bookings_archive", "member_id", "booking_time", Booking),
+    "payment": ("payments", "user_id", "created_at", Payment),
+    "progress": ("progress", "member_id", "recorded_date", Progress),
+    "feedback": ("feedback", "member_id", "created_at", Feedback),
+}
+# Bookings moved to the archive are still bookings to the client
+TIMELINE_TYPES = {"archived_booking": "booking"}
+
+def encode_timeline_cursor(at: datetime, document_id: uuid.UUID) -> str:
+    raw = json.dumps({"at": as_utc(at).isoformat(), "id": str(document_id)})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_timeline_cursor(cursor: str) -> tuple:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(raw["at"]), uuid.UUID(raw["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def timeline_pipeline(source: str, user: UserBase, after: Optional[tuple], limit: int) -> list:
+    """One source's keyset page, newest first, tagged with its type and time"""
+    _, owner_field, time_field, _ = TIMELINE_SOURCES[source]
+    query = in_gym(user.gym_id, {owner_field: user.id})
+    if after:
+        at, document_id = after
+        query["$or"] = [{time_field: {"$lt": at}}, {time_field: at, "_id": {"$lt": document_id}}]
+    return [
+        {"$match": query},
+        {"$sort": {time_field: -1, "_id": -1}},
+        {"$limit": limit},
+        {"$set": {"timeline_type": source, "timeline_at": f"${time_field}"}},
+    ]
+
+@app.get("/api/me/timeline")
+async def get_timeline(cursor: Optional[str] = None, limit: int = 20, current_user: UserBase = Depends(get_current_user)):
+    limit = max(1, min(limit, 100))
+    after = decode_timeline_cursor(cursor) if cursor else None
+    
+    # Every source contributes at most limit + 1 rows, so the merge stays bounded however long the history
+    first, *others = TIMELINE_SOURCES
+    pipeline = timeline_pipeline(first, current_user, after, limit + 1)
+    for source in others:
+        pipeline.append({"$unionWith": {
+            "coll": TIMELINE_SOURCES[source][0],
+            "pipeline": timeline_pipeline(source, current_user, after, limit + 1)
+        }})
+    pipeline += [{"$sort": {"timeline_at": -1, "_id": -1}}, {"$limit": limit + 1}]
+    documents = await db[TIMELINE_SOURCES[first][0]].aggregate(pipeline).to_list(length=limit + 1)
+    
+    next_cursor = None
+    if len(documents) > limit:
+        last = documents[limit - 1]
+        next_cursor = encode_timeline_cursor(last["timeline_at"], last["_id"])
+    
+    items = []
+    seen = set()
+    for document in documents[:limit]:
+        source = document.pop("timeline_type")
+        at = document.pop("timeline_at")
+        kind = TIMELINE_TYPES.get(source, source)
+        # The archiver copies before it deletes, so a booking can briefly sit in both collections
+        if (kind, document["_id"]) in seen:
+            continue
+        seen.add((kind, document["_id"]))
+        items.append({"type": kind, "at": as_utc(at), "item": TIMELINE_SOURCES[source][3](**document)})
+    return {"items": items, "next_cursor": next_cursor}
+
 # Analytics endpoints (Admin only)
 @app.get("/api/analytics/dashboard")
 async def get_dashboard_analytics(current_user: UserBase = Depends(get_current_user)):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Admin access required")
     
+    # Admins see their own location
+    gym_id = current_user.gym_id
+    dashboard = stats_cache.get(gym_id)
+    if dashboard is not None:
+        return dashboard
+    
     # Get various counts and metrics
-    total_members = await db.users.count_documents({"role": UserRole.MEMBER, "is_active": True})
-    total_trainers = await db.users.count_documents({"role": UserRole.TRAINER, "is_active": True})
-    total_classes = await db.classes.count_documents({"status": ClassStatus.ACTIVE})
-    total_bookings = await db.bookings.count_documents({"status": BookingStatus.BOOKED})
+    total_members = await read_db.users.count_documents(in_gym(gym_id, {"role": UserRole.MEMBER, "is_active": True}))
+    total_trainers = await read_db.users.count_documents(in_gym(gym_id, {"role": UserRole.TRAINER, "is_active": True}))
+    total_classes = await read_db.classes.count_documents(in_gym(gym_id, {"status": ClassStatus.ACTIVE}))
+    total_bookings = await read_db.bookings.count_documents(in_gym(gym_id, {"status": BookingStatus.BOOKED}))
     
     # Revenue calculation
-    completed_payments = await db.payments.find({"status": PaymentStatus.COMPLETED}).to_list(length=None)
+    completed_payments = await read_db.payments.find(in_gym(gym_id, {"status": PaymentStatus.COMPLETED})).to_list(length=None)
     total_revenue = sum(payment["amount"] for payment in completed_payments)
     
-    return {
+    dashboard = {
         "total_members": total_members,
         "total_trainers": total_trainers,
         "total_classes": total_classes,
         "total_bookings": total_bookings,
         "total_revenue": total_revenue,
-        "pending_approvals": await db.users.count_documents({"is_approved": False})
+        "pending_approvals": await read_db.users.count_documents(in_gym(gym_id, {"is_approved": False}))
     }
+    stats_cache.set(gym_id, dashboard)
+    return dashboard
+
+@app.get("/api/analytics/pool")
+async def get_pool_stats(current_user: UserBase = Depends(get_current_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return pool_stats.snapshot()
+
+@app.get("/api/analytics/load")
+async def get_load_stats(current_user: UserBase = Depends(get_current_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return admission_controller.snapshot()
+
+@app.get("/api/analytics/scheduler")
+async def get_scheduler_stats(current_user: UserBase = Depends(get_current_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {"worker_id": WORKER_ID, "jobs": scheduler_metrics}
+
+@app.get("/api/analytics/payment-gateway")
+async def get_payment_gateway_stats(current_user: UserBase = Depends(get_current_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {"worker_id": WORKER_ID, "enabled": PAYPAL_ENABLED, **payment_gateway.metrics}
+
+# Export endpoints (Admin only)
+EXPORT_BATCH_SIZE = 1000
+PARQUET_ROW_GROUP_SIZE = 50_000
+
+# date field used for range filters, then (column, type) pairs
+EXPORT_SPECS = {
+    "bookings": ("booking_time", [
+        ("id", "string"), ("gym_id", "string"), ("member_id", "string"), ("class_id", "string"),
+        ("class_name", "string"), ("class_start_time", "timestamp"), ("booking_time", "timestamp"),
+        ("status", "string"), ("payment_status", "string"), ("payment_id", "string"),
+    ]),
+    "payments": ("created_at", [
+        ("id", "string"), ("gym_id", "string"), ("user_id", "string"), ("booking_id", "string"), ("amount", "float"),
+        ("payment_type", "string"), ("paypal_order_id", "string"), ("status", "string"),
+        ("created_at", "timestamp"), ("completed_at", "timestamp"),
+    ]),
+    "users": ("date_joined", [
+        ("id", "string"), ("gym_id", "string"), ("email", "string"), ("full_name", "string"), ("role", "string"),
+        ("phone", "string"), ("date_joined", "timestamp"), ("is_active", "bool"),
+        ("is_approved", "bool"),
+    ]),
+}
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return as_utc(value).isoformat()
+    return value
+
+async def export_documents(*cursors):
+    for cursor in cursors:
+        async for document in cursor:
+            document["id"] = str_id(document)
+            yield document
+
+async def stream_csv(cursor, names: List[str]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    rows = 0
+    async for document in cursor:
+        writer.writerow([export_value(document.get(name)) for name in names])
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+async def stream_ndjson(cursor, names: List[str]):
+    lines = []
+    async for document in cursor:
+        lines.append(json.dumps({name: export_value(document.get(name)) for name in names}))
+        if len(lines) == EXPORT_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+class ParquetChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+PARQUET_TYPES = {
+    "string": lambda: pa.string(),
+    "float": lambda: pa.float64(),
+    "bool": lambda: pa.bool_(),
+    "timestamp": lambda: pa.timestamp("us", tz="UTC"),
+}
+
+def write_parquet_row_group(writer, rows: List[Dict[str, Any]], columns: List[tuple], schema):
+    frame = pd.DataFrame.from_records(rows, columns=[name for name, _ in columns])
+    for name, column_type in columns:
+        if column_type == "timestamp":
+            frame[name] = pd.to_datetime(frame[name], utc=True)
+    writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+
+async def stream_parquet(cursor, columns: List[tuple]):
+    schema = pa.schema([(name, PARQUET_TYPES[column_type]()) for name, column_type in columns])
+    sink = ParquetChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    rows = []
+    async for document in cursor:
+        rows.append(document)
+        if len(rows) == PARQUET_ROW_GROUP_SIZE:
+            # Building a row group is CPU-bound, keep it off the event loop
+            await asyncio.to_thread(write_parquet_row_group, writer, rows, columns, schema)
+            rows = []
+            yield sink.drain()
+    if rows:
+        await asyncio.to_thread(write_parquet_row_group, writer, rows, columns, schema)
+    writer.close()
+    yield sink.drain()
+
+@app.get("/api/export/{collection}")
+async def export_collection(
+    collection: str,
+    format: ExportFormat = ExportFormat.CSV,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: UserBase = Depends(get_current_user)
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if collection not in EXPORT_SPECS:
+        raise HTTPException(status_code=404, detail="Unknown export")
+    if format == ExportFormat.PARQUET and pa is None:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    
+    date_field, columns = EXPORT_SPECS[collection]
+    names = [name for name, _ in columns]
+    query = in_gym(current_user.gym_id)
+    if start or end:
+        query[date_field] = {}
+        if start:
+            query[date_field]["$gte"] = start
+        if end:
+            query[date_field]["$lt"] = end
+    projection = {name: 1 for name in names if name != "id"}
+    collections = [collection]
+    if collection in ARCHIVED_COLLECTIONS and (start is None or as_utc(start) < archive_horizon()):
+        collections.append(f"{collection}_archive")
+    cursor = export_documents(*(
+        read_db[name].find(query, projection, batch_size=EXPORT_BATCH_SIZE) for name in collections
+    ))
+    
+    if format == ExportFormat.CSV:
+        body = stream_csv(cursor, names)
+    elif format == ExportFormat.NDJSON:
+        body = stream_ndjson(cursor, names)
+    else:
+        body = stream_parquet(cursor, columns)
+    
+    filename = f"{collection}-{datetime.now(timezone.utc):%Y%m%d%H%M%S}.{format.value}"
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    # Workers are separate processes, so the app is passed by import string
+    uvicorn.run("server:app", host="0.0.0.0", port=8001, workers=WEB_CONCURRENCY)
\ No newline at end of file
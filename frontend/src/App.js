@@ -17,7 +17,7 @@ const API_BASE = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
 
 // API Helper
 const api = {
-  async request(endpoint, options = {}) {
+  async send(endpoint, options = {}) {
     const token = localStorage.getItem('token');
     const config = {
       headers: {
@@ -34,9 +34,25 @@ const api = {
       throw new Error(error.detail || 'API request failed');
     }
     
+    return response;
+  },
+
+  async request(endpoint, options = {}) {
+    const response = await api.send(endpoint, options);
     return response.json();
   },
 
+  // One page of a cursor-paginated listing; total is only sent with the first page
+  async getPage(endpoint) {
+    const response = await api.send(endpoint);
+    const total = response.headers.get('X-Total-Count');
+    return {
+      items: await response.json(),
+      nextCursor: response.headers.get('X-Next-Cursor'),
+      total: total === null ? null : Number(total),
+    };
+  },
+
   get: (endpoint) => api.request(endpoint),
   post: (endpoint, data) => api.request(endpoint, {
     method: 'POST',
@@ -870,10 +886,20 @@ const ClassForm = ({ trainerId, onSuccess }) => {
 };
 
 // Admin Dashboard Component
+const USERS_PAGE_SIZE = 50;
+const PENDING_PAGE_SIZE = 50;
+
 const AdminDashboard = () => {
   const { user } = useAuth();
   const [activeTab, setActiveTab] = useState('dashboard');
   const [users, setUsers] = useState([]);
+  const [userFilters, setUserFilters] = useState({ q: '', role: '' });
+  const [searchText, setSearchText] = useState('');
+  // Cursor that opened each page visited so far, so Previous can go back
+  const [pageCursors, setPageCursors] = useState([null]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalUsers, setTotalUsers] = useState(0);
+  const [pendingUsers, setPendingUsers] = useState([]);
   const [analytics, setAnalytics] = useState({});
   const [loading, setLoading] = useState(false);
 
@@ -881,15 +907,19 @@ const AdminDashboard = () => {
     loadData();
   }, []);
 
+  useEffect(() => {
+    loadUsersPage([null]);
+  }, [userFilters]);
+
   const loadData = async () => {
     setLoading(true);
     try {
-      const [usersData, analyticsData] = await Promise.all([
-        api.get('/api/users'),
+      const [pendingData, analyticsData] = await Promise.all([
+        api.get(`/api/users?is_approved=false&limit=${PENDING_PAGE_SIZE}`),
         api.get('/api/analytics/dashboard')
       ]);
       
-      setUsers(usersData);
+      setPendingUsers(pendingData);
       setAnalytics(analyticsData);
     } catch (error) {
       console.error('Error loading data:', error);
@@ -898,10 +928,37 @@ const AdminDashboard = () => {
     }
   };
 
+  const loadUsersPage = async (cursors) => {
+    const params = new URLSearchParams({ limit: USERS_PAGE_SIZE });
+    if (userFilters.q) params.set('q', userFilters.q);
+    if (userFilters.role) params.set('role', userFilters.role);
+    const cursor = cursors[cursors.length - 1];
+    if (cursor) params.set('cursor', cursor);
+    try {
+      const page = await api.getPage(`/api/users?${params}`);
+      setUsers(page.items);
+      setNextCursor(page.nextCursor);
+      if (page.total !== null) setTotalUsers(page.total);
+      setPageCursors(cursors);
+    } catch (error) {
+      console.error('Error loading users:', error);
+    }
+  };
+
+  const refresh = () => {
+    loadData();
+    loadUsersPage(pageCursors);
+  };
+
+  const handleSearch = (e) => {
+    e.preventDefault();
+    setUserFilters({ ...userFilters, q: searchText.trim() });
+  };
+
   const handleApproveUser = async (userId) => {
     try {
       await api.put(`/api/users/${userId}/approve`);
-      loadData();
+      refresh();
       alert('User approved successfully!');
     } catch (error) {
       alert('Error approving user: ' + error.message);
@@ -912,7 +969,7 @@ const AdminDashboard = () => {
     if (window.confirm('Are you sure you want to deactivate this user?')) {
       try {
         await api.put(`/api/users/${userId}/deactivate`);
-        loadData();
+        refresh();
         alert('User deactivated successfully!');
       } catch (error) {
         alert('Error deactivating user: ' + error.message);
@@ -923,7 +980,7 @@ const AdminDashboard = () => {
   const tabs = [
     { id: 'dashboard', label: 'Dashboard', icon: '📊' },
     { id: 'users', label: 'User Management', icon: '👥' },
-    { id: 'approvals', label: `Approvals (${users.filter(u => !u.is_approved).length})`, icon: '✅' }
+    { id: 'approvals', label: `Approvals (${analytics.pending_approvals ?? pendingUsers.length})`, icon: '✅' }
   ];
 
   const renderDashboard = () => (
@@ -1004,8 +1061,33 @@ const AdminDashboard = () => {
 
   const renderUsers = () => (
     <div className="bg-white rounded-lg shadow overflow-hidden">
-      <div className="px-6 py-4 border-b border-gray-200">
-        <h3 className="text-lg font-medium text-gray-900">All Users</h3>
+      <div className="px-6 py-4 border-b border-gray-200 flex flex-wrap items-center justify-between gap-4">
+        <h3 className="text-lg font-medium text-gray-900">All Users ({totalUsers})</h3>
+        <form onSubmit={handleSearch} className="flex space-x-2">
+          <input
+            type="search"
+            placeholder="Search name or email"
+            className="px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500"
+            value={searchText}
+            onChange={(e) => setSearchText(e.target.value)}
+          />
+          <select
+            className="px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500"
+            value={userFilters.role}
+            onChange={(e) => setUserFilters({ ...userFilters, role: e.target.value })}
+          >
+            <option value="">All roles</option>
+            <option value="member">Member</option>
+            <option value="trainer">Trainer</option>
+            <option value="admin">Admin</option>
+          </select>
+          <button
+            type="submit"
+            className="px-4 py-2 rounded-md text-sm font-medium text-white bg-indigo-600 hover:bg-indigo-700"
+          >
+            Search
+          </button>
+        </form>
       </div>
       <div className="overflow-x-auto">
         <table className="min-w-full divide-y divide-gray-200">
@@ -1086,15 +1168,34 @@ const AdminDashboard = () => {
           </tbody>
         </table>
       </div>
+      <div className="px-6 py-4 border-t border-gray-200 flex justify-between">
+        <button
+          onClick={() => loadUsersPage(pageCursors.slice(0, -1))}
+          disabled={pageCursors.length === 1}
+          className="text-sm font-medium text-indigo-600 hover:text-indigo-900 disabled:opacity-50"
+        >
+          Previous
+        </button>
+        <button
+          onClick={() => loadUsersPage([...pageCursors, nextCursor])}
+          disabled={!nextCursor}
+          className="text-sm font-medium text-indigo-600 hover:text-indigo-900 disabled:opacity-50"
+        >
+          Next
+        </button>
+      </div>
     </div>
   );
 
   const renderApprovals = () => {
-    const pendingUsers = users.filter(u => !u.is_approved);
-    
     return (
       <div className="space-y-4">
         <h3 className="text-xl font-semibold mb-4">Pending Approvals</h3>
+        {analytics.pending_approvals > pendingUsers.length && (
+          <p className="text-sm text-gray-500">
+            Showing the first {pendingUsers.length} of {analytics.pending_approvals}; approve these to see more.
+          </p>
+        )}
         {pendingUsers.map(user => (
           <div key={user.id} className="bg-white p-6 rounded-lg shadow border">
             <div className="flex justify-between items-start">
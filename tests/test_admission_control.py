@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+from starlette.responses import StreamingResponse
+
+import server
+
+
+def make_controller(max_in_flight=1, max_queued=10, latency_budget_ms=60000):
+    return server.AdmissionController(max_in_flight, max_queued, latency_budget_ms)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_waiters_are_admitted_in_priority_order():
+    async def scenario():
+        controller = make_controller()
+        assert await controller.acquire(1) is None
+        order = []
+
+        async def waiter(priority, name):
+            assert await controller.acquire(priority) is None
+            order.append(name)
+
+        tasks = [asyncio.create_task(waiter(2, "export")), asyncio.create_task(waiter(0, "login"))]
+        await settle()
+        assert controller.snapshot()["queued_now"] == 2
+        controller.release(None)
+        await settle()
+        controller.release(None)
+        await asyncio.gather(*tasks)
+        assert order == ["login", "export"]
+        controller.release(None)
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_displaces_lowest_priority_waiter():
+    async def scenario():
+        controller = make_controller(max_queued=1)
+        await controller.acquire(1)
+        low = asyncio.create_task(controller.acquire(2))
+        await settle()
+        high = asyncio.create_task(controller.acquire(0))
+        await settle()
+        assert low.done() and low.result() >= 1
+        assert controller.shed == {"displaced:p2": 1}
+        # A request no better than the queued one is turned away instead
+        assert await controller.acquire(0) >= 1
+        assert controller.shed["queue_full:p0"] == 1
+        controller.release(None)
+        assert await high is None
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_gives_its_place_back():
+    async def scenario():
+        controller = make_controller()
+        await controller.acquire(1)
+        gone = asyncio.create_task(controller.acquire(1))
+        await settle()
+        gone.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await gone
+        controller.release(None)
+        assert controller.in_flight == 0
+        assert await controller.acquire(1) is None
+
+    asyncio.run(scenario())
+
+
+def test_waiter_cancelled_after_being_handed_a_slot_releases_it():
+    async def scenario():
+        controller = make_controller()
+        await controller.acquire(1)
+        gone = asyncio.create_task(controller.acquire(1))
+        await settle()
+        controller.release(None)
+        gone.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await gone
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_timed_out_waiters_do_not_fill_the_queue():
+    async def scenario():
+        controller = make_controller(max_queued=1, latency_budget_ms=50)
+        await controller.acquire(1)
+        assert await controller.acquire(1) >= 1
+        assert controller.shed == {"timeout:p1": 1}
+        # The timed-out entry is still in the heap, but the queue has room for a live waiter
+        waiter = asyncio.create_task(controller.acquire(1))
+        await settle()
+        assert not waiter.done()
+        controller.release(None)
+        assert await waiter is None
+        assert "queue_full:p1" not in controller.shed
+
+    asyncio.run(scenario())
+
+
+def test_waiting_past_latency_budget_sheds_immediately():
+    async def scenario():
+        controller = make_controller(latency_budget_ms=10)
+        controller.service_time = 1.0
+        await controller.acquire(1)
+        assert await controller.acquire(0) == 1
+        assert controller.shed == {"latency_budget:p0": 1}
+
+    asyncio.run(scenario())
+
+
+def run_request(middleware, path):
+    scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # The client stays connected until the response is done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        pass
+
+    asyncio.run(middleware(scope, receive, send))
+
+
+def test_service_time_counts_until_response_start():
+    async def rows():
+        yield b"{}\n"
+        await asyncio.sleep(0.5)
+        yield b"{}\n"
+
+    controller = make_controller()
+    middleware = server.LoadSheddingMiddleware(StreamingResponse(rows()), controller)
+    run_request(middleware, "/api/export/bookings")
+    # The stream took half a second, but only the time to its first byte feeds the average
+    assert controller.service_time < 0.05 * 0.9 + 0.1 * 0.25
+    assert controller.in_flight == 0
+
+
+def test_untimed_routes_leave_service_time_alone():
+    async def rows():
+        await asyncio.sleep(0.2)
+        yield b"{}\n"
+
+    controller = make_controller()
+    middleware = server.LoadSheddingMiddleware(StreamingResponse(rows()), controller)
+    run_request(middleware, "/api/progress/import")
+    assert controller.service_time == 0.05
@@ -0,0 +1,96 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+import server
+
+
+class FakeCollection:
+    def __init__(self, name, log, documents=()):
+        self.name = name
+        self.log = log
+        self.documents = list(documents)
+        self.fail_with = None
+
+    def find(self, query):
+        matches = [document for document in self.documents if document["gym_id"] == query["gym_id"]]
+        if "class_id" in query:
+            matches = [document for document in matches if document["class_id"] in query["class_id"]["$in"]]
+        cursor = SimpleNamespace(to_list=lambda length=None: asyncio.sleep(0, matches[:length]))
+        cursor.limit = lambda n: cursor
+        return cursor
+
+    async def insert_many(self, documents, ordered=True):
+        self.log.append(("insert", self.name))
+        if self.fail_with:
+            raise self.fail_with
+        self.documents += documents
+
+    async def delete_many(self, query):
+        self.log.append(("delete", self.name))
+        ids = set(query["_id"]["$in"])
+        self.documents = [document for document in self.documents if document["_id"] not in ids]
+
+
+class FakeDb(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+def archive_db(classes, bookings):
+    log = []
+    fake = FakeDb(
+        classes=FakeCollection("classes", log, classes),
+        bookings=FakeCollection("bookings", log, bookings),
+        classes_archive=FakeCollection("classes_archive", log),
+        bookings_archive=FakeCollection("bookings_archive", log),
+        users=SimpleNamespace(distinct=lambda field: asyncio.sleep(0, ["gym-1"])),
+    )
+    return fake, log
+
+
+def old_class(gym_id="gym-1"):
+    return {"_id": uuid.uuid4(), "gym_id": gym_id}
+
+
+def test_archive_copies_before_deleting_bookings_then_classes(monkeypatch):
+    cls = old_class()
+    booking = {"_id": uuid.uuid4(), "gym_id": "gym-1", "class_id": str(cls["_id"])}
+    fake, log = archive_db([cls], [booking])
+    monkeypatch.setattr(server, "db", fake)
+    assert asyncio.run(server.archive_old_classes()) == {"classes_archived": 1, "bookings_archived": 1}
+    assert log == [
+        ("insert", "classes_archive"), ("insert", "bookings_archive"),
+        ("delete", "bookings"), ("delete", "classes"),
+    ]
+    assert fake.classes_archive.documents == [cls] and fake.bookings_archive.documents == [booking]
+    assert fake.classes.documents == [] and fake.bookings.documents == []
+
+
+def test_archive_works_through_full_batches(monkeypatch):
+    monkeypatch.setattr(server, "ARCHIVE_BATCH_SIZE", 2)
+    fake, _ = archive_db([old_class() for _ in range(3)], [])
+    monkeypatch.setattr(server, "db", fake)
+    assert asyncio.run(server.archive_old_classes())["classes_archived"] == 3
+    assert len(fake.classes_archive.documents) == 3
+
+
+def test_copies_left_by_an_interrupted_run_are_tolerated(monkeypatch):
+    fake, _ = archive_db([old_class()], [])
+    fake.classes_archive.fail_with = BulkWriteError({"writeErrors": [{"code": 11000}]})
+    monkeypatch.setattr(server, "db", fake)
+    asyncio.run(server.archive_old_classes())
+    assert fake.classes.documents == []
+
+
+def test_other_copy_errors_keep_the_originals(monkeypatch):
+    fake, log = archive_db([old_class()], [])
+    fake.classes_archive.fail_with = BulkWriteError({"writeErrors": [{"code": 121}]})
+    monkeypatch.setattr(server, "db", fake)
+    with pytest.raises(BulkWriteError):
+        asyncio.run(server.archive_old_classes())
+    assert len(fake.classes.documents) == 1
+    assert ("delete", "classes") not in log
@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import server
+
+
+def index(*texts):
+    autocomplete = server.AutocompleteIndex("gym-1")
+    autocomplete.build(list(texts))
+    return autocomplete
+
+
+def test_suggest_matches_any_word_of_a_name():
+    autocomplete = index("Morning Yoga", "Yoga Flow", "Spin")
+    assert autocomplete.suggest("yo", 10) == ["Morning Yoga", "Yoga Flow"]
+    assert autocomplete.suggest("morning  YO", 10) == ["Morning Yoga"]
+    assert autocomplete.suggest("flow", 10) == ["Yoga Flow"]
+    assert autocomplete.suggest("oga", 10) == []
+
+
+def test_suggest_ranks_frequent_names_first_and_applies_the_limit():
+    autocomplete = index("Yoga Flow", "Morning Yoga", "Yoga Flow", "Yin Yoga")
+    assert autocomplete.suggest("y", 10) == ["Yoga Flow", "Morning Yoga", "Yin Yoga"]
+    assert autocomplete.suggest("y", 2) == ["Yoga Flow", "Morning Yoga"]
+
+
+def test_suggest_ignores_blank_prefixes():
+    assert index("Spin").suggest(" -- ", 10) == []
+
+
+def test_refresh_rebuilds_only_when_stale(monkeypatch):
+    reads = []
+
+    def find(query, projection=None):
+        reads.append(query)
+        classes = [{"name": "Spin", "trainer_name": "Ana Lee"}]
+        return SimpleNamespace(to_list=lambda length=None: asyncio.sleep(0, classes))
+
+    monkeypatch.setattr(server, "db", SimpleNamespace(classes=SimpleNamespace(find=find)))
+    autocomplete = server.AutocompleteIndex("gym-1")
+    asyncio.run(autocomplete.refresh())
+    asyncio.run(autocomplete.refresh())
+    assert len(reads) == 1
+    assert reads[0]["gym_id"] == "gym-1"
+    assert autocomplete.suggest("lee", 5) == ["Ana Lee"]
+    autocomplete.invalidate()
+    asyncio.run(autocomplete.refresh())
+    assert len(reads) == 2
+
+
+def test_failed_refresh_stays_stale(monkeypatch):
+    def find(query, projection=None):
+        async def fail(length=None):
+            raise RuntimeError("primary unavailable")
+        return SimpleNamespace(to_list=fail)
+
+    monkeypatch.setattr(server, "db", SimpleNamespace(classes=SimpleNamespace(find=find)))
+    autocomplete = server.AutocompleteIndex("gym-1")
+    with pytest.raises(RuntimeError):
+        asyncio.run(autocomplete.refresh())
+    assert autocomplete.stale
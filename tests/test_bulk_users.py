@@ -0,0 +1,79 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+ADMIN = server.UserBase(email="a@email.com", full_name="Admin", role=server.UserRole.ADMIN)
+
+
+class FakeUsers:
+    def __init__(self, documents):
+        self.documents = documents
+        self.writes = []
+
+    def find(self, query, projection=None):
+        documents = self.documents
+        return SimpleNamespace(to_list=lambda length=None: asyncio.sleep(0, documents[:length]))
+
+    async def bulk_write(self, requests, ordered=True):
+        self.writes += requests
+
+
+def run_bulk(monkeypatch, action, users, **request):
+    fake = FakeUsers(users)
+    notified = []
+
+    async def notify(gym_id, user_ids, *notification):
+        notified.append((user_ids, notification[0]))
+
+    monkeypatch.setattr(server, "db", SimpleNamespace(users=fake))
+    monkeypatch.setattr(server, "create_notifications", notify)
+    result = asyncio.run(server.bulk_update_users(action, server.BulkUserRequest(**request), ADMIN))
+    return result, fake.writes, notified
+
+
+def test_deactivate_reports_each_user_and_skips_the_caller(monkeypatch):
+    active, inactive, missing = uuid.uuid4(), uuid.uuid4(), str(uuid.uuid4())
+    users = [
+        {"_id": uuid.UUID(ADMIN.id), "is_active": True},
+        {"_id": active, "is_active": True},
+        {"_id": inactive, "is_active": False},
+    ]
+    ids = [ADMIN.id, str(active), str(inactive), missing]
+    result, writes, notified = run_bulk(monkeypatch, server.BulkUserAction.DEACTIVATE, users, user_ids=ids)
+    assert result["updated"] == 1
+    assert {row["user_id"]: row["status"] for row in result["results"]} == {
+        ADMIN.id: "skipped", str(active): "updated", str(inactive): "unchanged", missing: "not_found"
+    }
+    # The $ne guard keeps a concurrent duplicate from writing twice
+    assert writes[0]._filter["is_active"] == {"$ne": False}
+    assert notified == []
+
+
+def test_approve_by_filter_notifies_updated_users(monkeypatch):
+    pending = uuid.uuid4()
+    users = [{"_id": pending, "is_approved": False}]
+    result, writes, notified = run_bulk(
+        monkeypatch, server.BulkUserAction.APPROVE, users, role="trainer", is_approved=False
+    )
+    assert result["updated"] == 1 and len(writes) == 1
+    assert notified == [([str(pending)], "Account Approved")]
+
+
+@pytest.mark.parametrize("request_fields", [{}, {"user_ids": ["x"] * (server.MAX_BULK_USERS + 1)}])
+def test_bulk_request_needs_a_bounded_selection(monkeypatch, request_fields):
+    with pytest.raises(HTTPException) as exc:
+        run_bulk(monkeypatch, server.BulkUserAction.APPROVE, [], **request_fields)
+    assert exc.value.status_code == 400
+
+
+def test_filter_matching_too_many_users_is_rejected(monkeypatch):
+    users = [{"_id": uuid.uuid4(), "is_active": True} for _ in range(3)]
+    monkeypatch.setattr(server, "MAX_BULK_USERS", 2)
+    with pytest.raises(HTTPException) as exc:
+        run_bulk(monkeypatch, server.BulkUserAction.DEACTIVATE, users, role="member")
+    assert exc.value.status_code == 400
@@ -0,0 +1,83 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+CLASS_ID = str(uuid.uuid4())
+TRAINER = server.UserBase(email="t@email.com", full_name="Trainer", role=server.UserRole.TRAINER)
+
+
+class FakeBookings:
+    def __init__(self, bookings):
+        self.bookings = bookings
+        self.updates = []
+
+    def find(self, query, projection=None, session=None):
+        wanted = set(query["member_id"]["$in"])
+        found = [booking for booking in self.bookings if booking["member_id"] in wanted]
+        return SimpleNamespace(to_list=lambda length=None: asyncio.sleep(0, found))
+
+    async def update_many(self, query, update, session=None):
+        self.updates.append((query, update))
+
+
+class FakeStats:
+    def __init__(self):
+        self.writes = []
+
+    async def bulk_write(self, requests, ordered=True, session=None):
+        self.writes += requests
+
+
+def check_in(monkeypatch, bookings, member_ids, trainer_id=TRAINER.id):
+    async def find_class(query, projection=None):
+        return {"_id": query["_id"], "trainer_id": trainer_id, "name": "Yoga"}
+
+    fake = SimpleNamespace(
+        classes=SimpleNamespace(find_one=find_class), bookings=FakeBookings(bookings), member_stats=FakeStats()
+    )
+    monkeypatch.setattr(server, "db", fake)
+    monkeypatch.setattr(server, "transactions_enabled", False)
+    request = server.CheckInRequest(member_ids=member_ids)
+    return fake, asyncio.run(server.check_in_members(CLASS_ID, request, TRAINER))
+
+
+def booking(member_id, status):
+    return {"_id": uuid.uuid4(), "member_id": member_id, "status": status}
+
+
+def test_check_in_reports_a_result_per_member(monkeypatch):
+    bookings = [
+        booking("booked", server.BookingStatus.BOOKED),
+        booking("late", server.BookingStatus.NO_SHOW),
+        booking("here", server.BookingStatus.ATTENDED),
+    ]
+    fake, result = check_in(monkeypatch, bookings, ["booked", "late", "here", "stranger", "booked"])
+    assert result["checked_in"] == 2
+    # Duplicates collapse and the request order is kept
+    assert result["results"] == [
+        {"member_id": "booked", "status": "checked_in"},
+        {"member_id": "late", "status": "checked_in"},
+        {"member_id": "here", "status": "already_checked_in"},
+        {"member_id": "stranger", "status": "not_booked"},
+    ]
+    [(query, update)] = fake.bookings.updates
+    assert len(query["_id"]["$in"]) == 2
+    assert update["$set"]["status"] == server.BookingStatus.ATTENDED
+    assert [write._doc["$inc"] for write in fake.member_stats.writes] == [{"attendance_count": 1}] * 2
+
+
+def test_nothing_is_written_when_nobody_needs_checking_in(monkeypatch):
+    fake, result = check_in(monkeypatch, [booking("here", server.BookingStatus.ATTENDED)], ["here"])
+    assert result["checked_in"] == 0
+    assert fake.bookings.updates == [] and fake.member_stats.writes == []
+
+
+def test_trainers_only_check_in_their_own_classes(monkeypatch):
+    with pytest.raises(HTTPException) as exc:
+        check_in(monkeypatch, [], ["anyone"], trainer_id="someone-else")
+    assert exc.value.status_code == 403
@@ -0,0 +1,147 @@
+import asyncio
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+# A Monday
+START = datetime(2025, 1, 6, 9, 0, tzinfo=timezone.utc)
+
+
+def series(**overrides):
+    fields = {
+        "name": "Yoga",
+        "description": "Morning flow",
+        "trainer_id": "trainer",
+        "start_time": START,
+        "end_time": START + timedelta(hours=1),
+        "capacity": 10,
+        "price": 15.0,
+        "until": START + timedelta(days=27),
+    }
+    fields.update(overrides)
+    return server.ClassSeriesCreate(**fields)
+
+
+def starts(occurrences):
+    return [start for start, _ in occurrences]
+
+
+def test_weekly_defaults_to_first_occurrence_weekday():
+    occurrences = server.expand_series(series())
+    assert starts(occurrences) == [START + timedelta(weeks=week) for week in range(4)]
+    assert all(end - start == timedelta(hours=1) for start, end in occurrences)
+
+
+def test_weekly_interval_and_weekdays():
+    occurrences = server.expand_series(series(interval=2, weekdays=[0, 2]))
+    # Monday and Wednesday of weeks 1 and 3
+    assert [start.date() for start in starts(occurrences)] == [
+        date(2025, 1, 6), date(2025, 1, 8), date(2025, 1, 20), date(2025, 1, 22)
+    ]
+
+
+def test_daily_interval():
+    occurrences = server.expand_series(series(frequency="daily", interval=10))
+    assert starts(occurrences) == [START, START + timedelta(days=10), START + timedelta(days=20)]
+
+
+def test_exceptions_are_skipped():
+    occurrences = server.expand_series(series(exceptions=[date(2025, 1, 13)]))
+    assert date(2025, 1, 13) not in [start.date() for start in starts(occurrences)]
+    assert len(occurrences) == 3
+
+
+def test_mixed_naive_and_aware_datetimes():
+    naive_until = (START + timedelta(days=7)).replace(tzinfo=None)
+    assert starts(server.expand_series(series(until=naive_until))) == [START, START + timedelta(weeks=1)]
+
+
+def test_occurrence_cap():
+    with pytest.raises(HTTPException) as exc:
+        server.expand_series(series(frequency="daily", until=START + timedelta(days=400)))
+    assert exc.value.status_code == 400
+
+
+def test_span_cap_rejects_far_until_before_walking():
+    with pytest.raises(HTTPException) as exc:
+        server.expand_series(series(frequency="daily", interval=10**6, until=datetime(9999, 1, 1)))
+    assert exc.value.status_code == 400
+    assert "span" in exc.value.detail
+
+
+class Recorder:
+    def __init__(self, found=()):
+        self.found = list(found)
+        self.calls = []
+
+    def find(self, *args, **kwargs):
+        found = self.found
+        return type("Cursor", (), {"to_list": lambda self, length=None: asyncio.sleep(0, found)})()
+
+    async def bulk_write(self, requests, **kwargs):
+        self.calls.append(("bulk_write", requests))
+
+    async def update_many(self, query, update, **kwargs):
+        self.calls.append(("update_many", update))
+
+
+def test_cancel_series_releases_seats_and_counts_cancellations(monkeypatch):
+    first, second = uuid.uuid4(), uuid.uuid4()
+    fake = SimpleNamespace(
+        classes=Recorder([{"_id": first}, {"_id": second}]),
+        bookings=Recorder([
+            {"class_id": str(first), "member_id": "ann"},
+            {"class_id": str(first), "member_id": "bob"},
+            {"class_id": str(second), "member_id": "ann"},
+        ]),
+        member_stats=Recorder(),
+    )
+    notified = []
+
+    async def owned_series(series_id, user):
+        return {}
+
+    async def notify(gym_id, member_ids, *args):
+        notified.extend(member_ids)
+
+    monkeypatch.setattr(server, "db", fake)
+    monkeypatch.setattr(server, "transactions_enabled", False)
+    monkeypatch.setattr(server, "get_owned_series", owned_series)
+    monkeypatch.setattr(server, "create_notifications", notify)
+    admin = server.UserBase(email="a@email.com", full_name="Admin", role=server.UserRole.ADMIN)
+
+    result = asyncio.run(server.cancel_class_series("series", admin))
+    assert result["cancelled"] == 2
+    [(_, class_writes)] = fake.classes.calls
+    assert [write._doc["$inc"]["enrolled_count"] for write in class_writes] == [-2, -1]
+    [(_, stats_writes)] = fake.member_stats.calls
+    assert {write._filter["_id"]: write._doc["$inc"]["classes_cancelled"] for write in stats_writes} == {"ann": 2, "bob": 1}
+    assert sorted(notified) == ["ann", "bob"]
+
+
+def test_create_series_with_naive_end_and_aware_start(monkeypatch):
+    inserted = []
+
+    class Classes:
+        def find(self, *args, **kwargs):
+            cursor = SimpleNamespace(to_list=lambda length=None: asyncio.sleep(0, []))
+            return SimpleNamespace(sort=lambda *args: cursor)
+
+        async def insert_many(self, documents):
+            inserted.extend(documents)
+
+    async def find_trainer(query):
+        return {"_id": query["_id"], "full_name": "Tia Trainer"}
+
+    monkeypatch.setattr(server, "db", SimpleNamespace(classes=Classes(), users=SimpleNamespace(find_one=find_trainer)))
+    admin = server.UserBase(email="a@email.com", full_name="Admin", role=server.UserRole.ADMIN)
+    data = series(end_time=(START + timedelta(minutes=45)).replace(tzinfo=None), until=START + timedelta(days=7))
+
+    classes = asyncio.run(server.create_class_series(data, admin))
+    assert [gym_class.duration for gym_class in classes] == [45, 45]
+    assert len(inserted) == 2
@@ -0,0 +1,79 @@
+import asyncio
+import csv
+import io
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+_, PAYMENT_COLUMNS = server.EXPORT_SPECS["payments"]
+NAMES = [name for name, _ in PAYMENT_COLUMNS]
+
+
+def payment(amount, completed_at=None):
+    return {
+        "_id": uuid.uuid4(), "gym_id": "main", "user_id": "u1", "booking_id": "b1", "amount": amount,
+        "payment_type": "class_booking", "status": "completed",
+        # Mongo hands back naive UTC datetimes
+        "created_at": datetime(2025, 1, 2, 3, 4, 5), "completed_at": completed_at,
+    }
+
+
+async def source(documents):
+    for document in documents:
+        yield dict(document)
+
+
+def collect(stream):
+    async def read():
+        return [chunk async for chunk in stream]
+
+    return asyncio.run(read())
+
+
+def exported(documents):
+    return server.export_documents(source(documents))
+
+
+def test_csv_export_writes_header_and_utc_timestamps(monkeypatch):
+    monkeypatch.setattr(server, "EXPORT_BATCH_SIZE", 1)
+    chunks = collect(server.stream_csv(exported([payment(15.0), payment(20.0)]), NAMES))
+    # One chunk per batch plus the remainder
+    assert len(chunks) == 3
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert [row["amount"] for row in rows] == ["15.0", "20.0"]
+    assert rows[0]["created_at"] == "2025-01-02T03:04:05+00:00"
+    assert rows[0]["paypal_order_id"] == ""
+
+
+def test_ndjson_export_writes_one_object_per_line():
+    documents = [payment(15.0)]
+    chunks = collect(server.stream_ndjson(exported(documents), NAMES))
+    [line] = "".join(chunks).splitlines()
+    record = json.loads(line)
+    assert record["id"] == str(documents[0]["_id"])
+    assert record["completed_at"] is None
+
+
+def test_parquet_export_round_trips_through_pyarrow(monkeypatch):
+    monkeypatch.setattr(server, "PARQUET_ROW_GROUP_SIZE", 2)
+    completed = datetime(2025, 1, 2, 4, tzinfo=timezone.utc)
+    documents = [payment(15.0, completed), payment(20.0), payment(25.5, completed)]
+    chunks = collect(server.stream_parquet(exported(documents), PAYMENT_COLUMNS))
+    # Row groups are streamed as they fill, the footer comes last
+    assert len(chunks) == 2
+
+    parquet = pq.ParquetFile(io.BytesIO(b"".join(chunks)))
+    assert parquet.metadata.num_row_groups == 2
+    table = pq.read_table(io.BytesIO(b"".join(chunks)))
+    assert table.column_names == NAMES
+    assert table.column("amount").to_pylist() == [15.0, 20.0, 25.5]
+    assert table.column("id").to_pylist() == [str(document["_id"]) for document in documents]
+    assert table.column("created_at").to_pylist()[0] == datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert table.column("completed_at").to_pylist() == [completed, None, completed]
+    assert table.column("paypal_order_id").null_count == 3
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+from pymongo.errors import OperationFailure
+
+import server
+
+
+def sign_up(**overrides):
+    fields = {"email": "new@email.com", "password": "secret", "full_name": "New Member", "role": "member"}
+    fields.update(overrides)
+    return server.UserCreate(**fields)
+
+
+def test_sign_up_defaults_to_default_gym():
+    assert sign_up().gym_id == server.DEFAULT_GYM_ID
+
+
+def test_sign_up_accepts_configured_locations(monkeypatch):
+    monkeypatch.setattr(server, "GYM_IDS", {server.DEFAULT_GYM_ID, "downtown"})
+    assert sign_up(gym_id="downtown").gym_id == "downtown"
+
+
+def test_sign_up_rejects_unknown_location():
+    with pytest.raises(ValidationError, match="Unknown location"):
+        sign_up(gym_id="made-up-gym")
+
+
+class FakeIndexes:
+    def __init__(self, drop_error=None):
+        self.drop_error = drop_error
+        self.created = 0
+
+    async def index_information(self):
+        return {"_id_": {}, "class_text": {}}
+
+    async def drop_index(self, name):
+        if self.drop_error:
+            raise self.drop_error
+
+    async def create_indexes(self, indexes):
+        self.created += 1
+
+
+class FakeDatabase:
+    def __init__(self, classes):
+        self.classes = classes
+        self.others = FakeIndexes()
+
+    def __getattr__(self, name):
+        return self.others
+
+
+def test_ensure_indexes_tolerates_text_index_dropped_by_another_worker(monkeypatch):
+    classes = FakeIndexes(OperationFailure("index not found with name [class_text]", code=27))
+    monkeypatch.setattr(server, "db", FakeDatabase(classes))
+    asyncio.run(server.ensure_indexes())
+    assert classes.created == 1
+
+
+def test_ensure_indexes_raises_other_drop_failures(monkeypatch):
+    classes = FakeIndexes(OperationFailure("not authorized", code=13))
+    monkeypatch.setattr(server, "db", FakeDatabase(classes))
+    with pytest.raises(OperationFailure):
+        asyncio.run(server.ensure_indexes())
@@ -0,0 +1,35 @@
+import asyncio
+
+import server
+
+
+def test_shutdown_waits_for_background_jobs_before_closing_mongo(monkeypatch):
+    events = []
+
+    async def job(name, run, interval):
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            # A job interrupted mid-write still needs the client while it unwinds
+            await asyncio.sleep(0)
+            events.append(f"{name} stopped")
+            raise
+
+    async def noop():
+        pass
+
+    monkeypatch.setattr(server, "connect_mongo", lambda: None)
+    monkeypatch.setattr(server, "warm_up_mongo", noop)
+    monkeypatch.setattr(server, "close_mongo", lambda: events.append("mongo closed"))
+    monkeypatch.setattr(server.payment_gateway, "aclose", noop)
+    monkeypatch.setattr(server, "CACHE_INVALIDATION_STREAM", False)
+    monkeypatch.setattr(server, "SCHEDULER_ENABLED", True)
+    monkeypatch.setattr(server, "run_periodic", job)
+
+    async def scenario():
+        async with server.lifespan(server.app):
+            await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert events[-1] == "mongo closed"
+    assert len(events) == 4
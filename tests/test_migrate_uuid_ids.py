@@ -0,0 +1,141 @@
+import asyncio
+import uuid
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+
+import migrate_uuid_ids
+import server
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, field, direction):
+        self.documents.sort(key=lambda document: document[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return self.documents[:length]
+
+
+class FakeCollection:
+    """Just enough of a collection for the migration; unique_fields stand in for unique indexes"""
+
+    def __init__(self, documents=(), unique_fields=()):
+        self.documents = {document["_id"]: document for document in documents}
+        self.unique_fields = unique_fields
+
+    async def list_indexes(self):
+        yield {"name": "_id_", "key": {"_id": 1}}
+
+    def find(self, query, projection=None):
+        condition = query["_id"]
+        if "$in" in condition:
+            found = [self.documents[key] for key in condition["$in"] if key in self.documents]
+        else:
+            found = [
+                document for key, document in self.documents.items()
+                if isinstance(key, ObjectId) and key > condition["$gt"]
+            ]
+        return FakeCursor(found)
+
+    async def find_one(self, query, projection=None):
+        return self.documents.get(query["_id"])
+
+    async def insert_one(self, document, session=None):
+        if document["_id"] in self.documents:
+            raise DuplicateKeyError("E11000 duplicate key error index: _id_")
+        for field in self.unique_fields:
+            if any(other[field] == document[field] for other in self.documents.values()):
+                raise DuplicateKeyError(f"E11000 duplicate key error index: {field}_1")
+        self.documents[document["_id"]] = document
+
+    async def insert_many(self, documents, ordered=True):
+        errors = []
+        for index, document in enumerate(documents):
+            try:
+                await self.insert_one(document)
+            except DuplicateKeyError:
+                errors.append({"index": index, "code": 11000})
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+    async def delete_one(self, query, session=None):
+        self.documents.pop(query["_id"], None)
+
+
+def legacy_user(email, user_id=None):
+    return {"_id": ObjectId(), "id": str(user_id or uuid.uuid4()), "email": email, "full_name": email}
+
+
+def migrate(monkeypatch, name, collections):
+    monkeypatch.setattr(server, "db", collections)
+    return asyncio.run(migrate_uuid_ids.migrate_collection(name, batch_size=2))
+
+
+def user_collections(users, backup=()):
+    return {"users": FakeCollection(users, unique_fields=["email"]), "users_legacy": FakeCollection(backup)}
+
+
+def test_users_survive_migration_with_unique_email_index(monkeypatch):
+    legacy = [legacy_user(f"member{n}@email.com") for n in range(5)]
+    collections = user_collections(legacy)
+    assert migrate(monkeypatch, "users", collections) == (5, 0)
+    users = collections["users"].documents
+    assert set(users) == {uuid.UUID(document["id"]) for document in legacy}
+    assert sorted(document["email"] for document in users.values()) == sorted(
+        document["email"] for document in legacy
+    )
+    # Every legacy user was backed up before it was deleted
+    assert set(collections["users_legacy"].documents) == {document["_id"] for document in legacy}
+
+
+def test_rerun_drops_legacy_copy_of_already_migrated_user(monkeypatch):
+    user_id = uuid.uuid4()
+    migrated = {"_id": user_id, "email": "copy@email.com", "full_name": "Copy"}
+    # An interrupted run left the legacy document behind next to its copy
+    collections = user_collections([migrated, legacy_user("old@email.com", user_id)])
+    assert migrate(monkeypatch, "users", collections) == (1, 0)
+    assert collections["users"].documents == {user_id: migrated}
+
+
+def test_rerun_restores_user_lost_between_delete_and_insert(monkeypatch):
+    lost = legacy_user("lost@email.com")
+    # The process died after deleting the legacy user and before inserting its copy
+    collections = user_collections([], backup=[lost])
+    assert migrate(monkeypatch, "users", collections) == (1, 0)
+    assert collections["users"].documents[uuid.UUID(lost["id"])]["email"] == "lost@email.com"
+
+
+def test_failed_insert_without_transaction_restores_legacy_user(monkeypatch):
+    class FlakyUsers(FakeCollection):
+        async def insert_one(self, document, session=None):
+            if isinstance(document["_id"], uuid.UUID):
+                raise PyMongoError("connection reset")
+            await super().insert_one(document, session)
+
+    legacy = legacy_user("member@email.com")
+    collections = {"users": FlakyUsers([legacy], unique_fields=["email"]), "users_legacy": FakeCollection()}
+    with pytest.raises(PyMongoError):
+        migrate(monkeypatch, "users", collections)
+    assert collections["users"].documents == {legacy["_id"]: legacy}
+
+
+def test_other_collections_insert_the_copy_before_deleting(monkeypatch):
+    class FailingDeletes(FakeCollection):
+        async def delete_one(self, query, session=None):
+            raise PyMongoError("connection reset")
+
+    booking = {"_id": ObjectId(), "id": str(uuid.uuid4()), "member_name": "Ann", "class_id": "c1"}
+    collections = {"bookings": FailingDeletes([booking])}
+    with pytest.raises(PyMongoError):
+        migrate(monkeypatch, "bookings", collections)
+    # Interrupted after the insert: both copies exist and nothing is lost
+    assert set(collections["bookings"].documents) == {booking["_id"], uuid.UUID(booking["id"])}
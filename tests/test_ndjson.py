@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+from pydantic import BaseModel
+from starlette.requests import Request
+
+import server
+
+
+class Item(BaseModel):
+    name: str
+    size: int = 0
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+        self.batch = None
+
+    def batch_size(self, size):
+        self.batch = size
+        return self
+
+    async def __aiter__(self):
+        for document in self.documents:
+            yield document
+
+
+def request(accept):
+    return Request({"type": "http", "headers": [(b"accept", accept.encode())] if accept else []})
+
+
+def chunks(response):
+    async def collect():
+        return [chunk async for chunk in response.body_iterator]
+    return asyncio.run(collect())
+
+
+def test_ndjson_is_chosen_by_the_accept_header():
+    assert server.wants_ndjson(request("application/x-ndjson"))
+    assert server.wants_ndjson(request("application/json, application/x-ndjson;q=0.9"))
+    assert not server.wants_ndjson(request("application/json"))
+    assert not server.wants_ndjson(request(""))
+
+
+def test_ndjson_response_streams_every_cursor_in_order(monkeypatch):
+    monkeypatch.setattr(server, "NDJSON_BATCH_SIZE", 2)
+    first = FakeCursor([{"name": "a", "size": 1}, {"name": "b"}, {"name": "c", "extra": True}])
+    second = FakeCursor([{"name": "d"}])
+    response = server.ndjson_response(Item, first, second)
+    assert response.media_type == server.NDJSON_MEDIA_TYPE
+    body = chunks(response)
+    # Full batches are flushed as they fill, and each cursor's remainder before the next cursor
+    assert [chunk.count("\n") for chunk in body] == [2, 1, 1]
+    lines = "".join(body).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"name": "a", "size": 1}, {"name": "b", "size": 0}, {"name": "c", "size": 0}, {"name": "d", "size": 0},
+    ]
+    assert first.batch == second.batch == 2
+
+
+def test_empty_cursors_stream_nothing():
+    assert chunks(server.ndjson_response(Item, FakeCursor([]))) == []
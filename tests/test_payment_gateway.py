@@ -0,0 +1,143 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import paypal_stub
+import server
+from payment_gateway import PaymentGatewayError, PayPalGateway
+
+
+@pytest.fixture(autouse=True)
+def fresh_stub():
+    paypal_stub.settings.update(latency_ms=0.0, failure_rate=0.0, token_ttl=32400)
+    for state in (paypal_stub.orders, paypal_stub.replies, paypal_stub.tokens):
+        state.clear()
+    paypal_stub.stats.update(token_requests=0, order_requests=0, injected_failures=0)
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """Backoff sleeps the gateway asked for, without waiting them out"""
+    recorded = []
+    sleep = asyncio.sleep
+
+    async def fake_sleep(delay, result=None):
+        recorded.append(delay)
+        return await sleep(0, result)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr("random.uniform", lambda low, high: 1.0)
+    return recorded
+
+
+def make_gateway(**options):
+    gateway = PayPalGateway("http://paypal.test", "client", "secret", **options)
+    gateway.client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=paypal_stub.app), base_url=gateway.base_url, timeout=gateway.timeout
+    )
+    return gateway
+
+
+def run(scenario):
+    async def wrapped():
+        gateway = make_gateway(max_retries=2, backoff_seconds=0.2)
+        try:
+            return await scenario(gateway)
+        finally:
+            await gateway.aclose()
+
+    return asyncio.run(wrapped())
+
+
+def fail_first(monkeypatch, count):
+    outcomes = iter([0.0] * count)
+    # The stub injects a 503 whenever random.random() falls under failure_rate
+    monkeypatch.setattr(paypal_stub.random, "random", lambda: next(outcomes, 1.0))
+    paypal_stub.settings["failure_rate"] = 0.5
+
+
+def test_access_token_is_cached_across_calls():
+    async def scenario(gateway):
+        order = await gateway.create_order("booking-1", 15)
+        await gateway.get_order(order["id"])
+        await gateway.get_order(order["id"])
+        return gateway.metrics
+
+    metrics = run(scenario)
+    assert paypal_stub.stats["token_requests"] == 1
+    assert metrics["token_fetches"] == 1
+
+
+def test_revoked_token_is_refreshed_once():
+    async def scenario(gateway):
+        order = await gateway.create_order("booking-1", 15)
+        paypal_stub.tokens.clear()
+        fetched = await gateway.get_order(order["id"])
+        return order, fetched, gateway.metrics
+
+    order, fetched, metrics = run(scenario)
+    assert fetched["id"] == order["id"]
+    assert metrics["token_fetches"] == 2
+
+
+def test_transient_failures_are_retried_with_backoff(monkeypatch, delays):
+    fail_first(monkeypatch, 2)
+
+    async def scenario(gateway):
+        await gateway.access_token()
+        return await gateway.create_order("booking-1", 15), gateway.metrics
+
+    order, metrics = run(scenario)
+    assert order["status"] == "APPROVED"
+    assert metrics["retries"] == 2
+    assert delays == [0.2, 0.4]
+
+
+def test_retries_give_up_with_the_last_status(monkeypatch, delays):
+    fail_first(monkeypatch, 10)
+
+    async def scenario(gateway):
+        with pytest.raises(PaymentGatewayError) as exc:
+            await gateway.access_token()
+        return exc.value, gateway.metrics
+
+    error, metrics = run(scenario)
+    assert error.status_code == 503
+    assert metrics["retries"] == 2 and metrics["errors"] == 1
+
+
+def test_create_order_retry_reuses_request_id():
+    async def scenario(gateway):
+        first = await gateway.create_order("booking-1", 15)
+        second = await gateway.create_order("booking-1", 15)
+        return first, second
+
+    first, second = run(scenario)
+    assert first["id"] == second["id"]
+    assert len(paypal_stub.orders) == 1
+
+
+def test_capture_paypal_order_accepts_already_captured_order(monkeypatch):
+    async def scenario(gateway):
+        monkeypatch.setattr(server, "payment_gateway", gateway)
+        order = await gateway.create_order("booking-1", 15)
+        # Captured by an earlier request whose reply never arrived
+        paypal_stub.orders[order["id"]]["status"] = "COMPLETED"
+        payment = {"_id": "payment-1", "paypal_order_id": order["id"]}
+        return order["id"], await server.capture_paypal_order(payment, order["id"])
+
+    order_id, captured = run(scenario)
+    assert captured == order_id
+
+
+def test_capture_paypal_order_rejects_unknown_order(monkeypatch):
+    async def scenario(gateway):
+        monkeypatch.setattr(server, "payment_gateway", gateway)
+        payment = {"_id": "payment-1", "paypal_order_id": "MISSING"}
+        with pytest.raises(HTTPException) as exc:
+            await server.capture_paypal_order(payment, "MISSING")
+        return exc.value
+
+    assert run(scenario).status_code == 402
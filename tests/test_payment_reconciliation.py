@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from payment_gateway import PaymentGatewayError
+
+NOW = datetime(2025, 3, 1, tzinfo=timezone.utc)
+EXPIRE_BEFORE = NOW - timedelta(hours=24)
+
+
+class FakeGateway:
+    def __init__(self, status=None, error=None):
+        self.status = status
+        self.error = error
+
+    async def get_order(self, order_id):
+        if self.error:
+            raise self.error
+        return {"id": order_id, "status": self.status}
+
+
+def verdict(monkeypatch, gateway, age_hours, order_id="ORDER1", enabled=True):
+    monkeypatch.setattr(server, "PAYPAL_ENABLED", enabled)
+    monkeypatch.setattr(server, "payment_gateway", gateway)
+    payment = {"_id": "p1", "paypal_order_id": order_id, "created_at": NOW - timedelta(hours=age_hours)}
+    return asyncio.run(server.payment_verdict(payment, EXPIRE_BEFORE))
+
+
+@pytest.mark.parametrize("status, expected", [
+    ("COMPLETED", "completed"),
+    ("VOIDED", "failed"),
+    ("APPROVED", "pending"),
+    ("CREATED", "pending"),
+])
+def test_order_status_decides_old_payments(monkeypatch, status, expected):
+    assert verdict(monkeypatch, FakeGateway(status), age_hours=48) == expected
+
+
+def test_missing_order_fails_the_payment(monkeypatch):
+    gateway = FakeGateway(error=PaymentGatewayError("PayPal returned 404", 404))
+    assert verdict(monkeypatch, gateway, age_hours=1) == "failed"
+
+
+def test_gateway_errors_leave_the_payment_for_the_next_run(monkeypatch):
+    gateway = FakeGateway(error=PaymentGatewayError("PayPal returned 503", 503))
+    assert verdict(monkeypatch, gateway, age_hours=48) == "error"
+
+
+def test_without_paypal_only_expiry_applies(monkeypatch):
+    gateway = FakeGateway(error=AssertionError("PayPal must not be called"))
+    assert verdict(monkeypatch, gateway, age_hours=1, enabled=False) == "pending"
+    assert verdict(monkeypatch, gateway, age_hours=48, enabled=False) == "failed"
+    assert verdict(monkeypatch, gateway, age_hours=48, order_id=None) == "failed"
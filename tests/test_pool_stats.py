@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+import server
+
+PRIMARY = ("db-0", 27017)
+SECONDARY = ("db-1", 27017)
+
+
+def event(address):
+    return SimpleNamespace(address=address)
+
+
+def test_utilization_is_per_server(monkeypatch):
+    monkeypatch.setattr(server, "MONGO_MAX_POOL_SIZE", 4)
+    listener = server.PoolStatsListener()
+    for address, count in ((PRIMARY, 3), (SECONDARY, 2)):
+        for _ in range(count):
+            listener.connection_created(event(address))
+            listener.connection_checked_out(event(address))
+    listener.connection_checked_in(event(SECONDARY))
+
+    snapshot = listener.snapshot()
+    assert snapshot["in_use"] == 4
+    assert snapshot["open_connections"] == 5
+    # 4 in use across two pools of 4 is not a saturated pool
+    assert snapshot["utilization"] == 0.75
+    assert {server["address"]: server["in_use"] for server in snapshot["servers"]} == {"db-0:27017": 3, "db-1:27017": 1}
+
+
+def test_closed_pool_is_forgotten():
+    listener = server.PoolStatsListener()
+    listener.connection_created(event(SECONDARY))
+    listener.pool_closed(event(SECONDARY))
+    assert listener.snapshot()["servers"] == []
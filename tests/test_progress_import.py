@@ -0,0 +1,108 @@
+import asyncio
+import io
+import math
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import server
+
+MEMBER = str(uuid.uuid4())
+
+
+def text(body):
+    return io.TextIOWrapper(io.BytesIO(body.encode()), encoding="utf-8-sig", newline="")
+
+
+def numbered(records, start=1):
+    return [(start + offset, record) for offset, record in enumerate(records)]
+
+
+def test_csv_records_keep_quoted_newlines():
+    rows = server.import_rows(text('member_id,weight,height,recorded_date\n\n"a\nb",70,,2024-01-01\n'), "csv")
+    assert server.read_records(rows, 1) == [["member_id", "weight", "height", "recorded_date"]]
+    # The blank line is skipped and the quoted newline stays inside its field
+    assert server.read_records(rows, 10) == [["a\nb", "70", "", "2024-01-01"]]
+
+
+def test_spool_request_body_rewinds_for_reading():
+    class FakeRequest:
+        async def stream(self):
+            for chunk in (b"\xef\xbb\xbfmember_id\n", b"abc\n"):
+                yield chunk
+
+    body = asyncio.run(server.spool_request_body(FakeRequest()))
+    assert body.read() == "member_id\nabc\n"
+
+
+def test_parse_import_records_reports_column_count_and_bad_json():
+    header = ["member_id", "weight"]
+    records, errors = server.parse_import_records(numbered([[MEMBER, "70"], [MEMBER]]), "csv", header)
+    assert records == [(1, {"member_id": MEMBER, "weight": "70"})]
+    assert errors == [(2, "expected 2 columns, got 1")]
+    records, errors = server.parse_import_records(numbered(['{"weight": 70}', "[1]", "{"]), "ndjson", None)
+    assert records == [(1, {"weight": 70})]
+    assert errors == [(2, "expected a JSON object"), (3, "invalid JSON")]
+
+
+def test_validate_progress_records_reports_first_failure_per_row():
+    records = numbered([
+        {"member_id": MEMBER, "weight": "80", "height": "200", "recorded_date": "2024-03-01"},
+        {"member_id": "", "weight": "80", "height": "", "recorded_date": "2024-03-01"},
+        {"member_id": MEMBER, "weight": "900", "height": "", "recorded_date": "2024-03-01"},
+        {"member_id": MEMBER, "weight": "", "height": "", "recorded_date": "2024-03-01"},
+        {"member_id": MEMBER, "weight": "70", "height": "", "recorded_date": "yesterday"},
+        {"member_id": MEMBER, "weight": None, "height": "180", "recorded_date": "2024-03-02T10:00:00Z"},
+    ])
+    columns, errors = server.validate_progress_records(records)
+    assert errors == [
+        (2, "member_id is required"),
+        (3, f"weight must be between 0 and {server.MAX_WEIGHT_KG} kg"),
+        (4, "weight or height is required"),
+        (5, "recorded_date must be an ISO 8601 date"),
+    ]
+    assert list(columns["rows"]) == [1, 6]
+    assert columns["bmi"][0] == 20.0 and math.isnan(columns["bmi"][1])
+    assert columns["recorded_date"][1] == datetime(2024, 3, 2, 10, tzinfo=timezone.utc)
+
+
+class FakeCollection:
+    def __init__(self, documents=()):
+        self.documents = list(documents)
+        self.writes = []
+
+    def find(self, query, projection=None):
+        wanted = set(query["_id"]["$in"])
+        found = [document for document in self.documents if document["_id"] in wanted]
+        return SimpleNamespace(to_list=lambda length=None: asyncio.sleep(0, found))
+
+    async def insert_many(self, documents, ordered=True):
+        self.documents += documents
+
+    async def bulk_write(self, requests, ordered=True):
+        self.writes += requests
+
+
+def test_import_progress_chunk_inserts_known_members_and_updates_stats(monkeypatch):
+    fake = SimpleNamespace(
+        users=FakeCollection([{"_id": uuid.UUID(MEMBER)}]),
+        progress=FakeCollection(),
+        member_stats=FakeCollection(),
+    )
+    monkeypatch.setattr(server, "db", fake)
+    header = ["member_id", "weight", "height", "recorded_date"]
+    lines = numbered([
+        [MEMBER, "80", "200", "2024-03-01"],
+        [MEMBER, "78", "", "2024-04-01"],
+        [str(uuid.uuid4()), "70", "", "2024-03-01"],
+        [MEMBER, "-1", "", "2024-03-01"],
+    ])
+    inserted, errors = asyncio.run(server.import_progress_chunk("main", lines, "csv", header))
+    assert inserted == 2
+    assert sorted(errors) == [(3, "unknown member"), (4, "weight must be between 0 and 500 kg")]
+    assert [document["weight"] for document in fake.progress.documents] == [80.0, 78.0]
+    assert "height" not in fake.progress.documents[1]
+    assert all(document["gym_id"] == "main" for document in fake.progress.documents)
+    # One stats update for the member, counting both rows
+    assert len(fake.member_stats.writes) == 1
+    assert fake.member_stats.writes[0]._filter == server.member_stats_key("main", MEMBER)
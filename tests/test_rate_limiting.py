@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import server
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(server.time, "monotonic", fake)
+    return fake
+
+
+def make_request(forwarded=None, host="10.0.0.1"):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (host, 1234)})
+
+
+def test_token_bucket_allows_burst_then_waits(clock):
+    limiter = server.TokenBucketLimiter(rate_per_minute=60, burst=3)
+    assert [limiter.acquire("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("a") == pytest.approx(1.0)
+
+
+def test_token_bucket_refills_over_time(clock):
+    limiter = server.TokenBucketLimiter(rate_per_minute=60, burst=1)
+    assert limiter.acquire("a") == 0.0
+    clock.now += 0.5
+    assert limiter.acquire("a") == pytest.approx(0.5)
+    clock.now += 0.5
+    assert limiter.acquire("a") == 0.0
+
+
+def test_token_bucket_keys_are_independent(clock):
+    limiter = server.TokenBucketLimiter(rate_per_minute=60, burst=1)
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("b") == 0.0
+    assert limiter.acquire("a") > 0
+
+
+def test_token_bucket_prunes_refilled_buckets(clock):
+    limiter = server.TokenBucketLimiter(rate_per_minute=60, burst=1, max_keys=2)
+    limiter.acquire("a")
+    limiter.acquire("b")
+    clock.now += 10
+    limiter.acquire("c")
+    assert set(limiter.buckets) == {"c"}
+
+
+def test_client_ip_uses_address_appended_by_proxy(monkeypatch):
+    monkeypatch.setattr(server, "TRUST_FORWARDED_FOR", True)
+    monkeypatch.setattr(server, "TRUSTED_PROXY_HOPS", 1)
+    # A client-forged first entry must not pick the bucket
+    assert server.client_ip(make_request("6.6.6.6, 203.0.113.7")) == "203.0.113.7"
+    assert server.client_ip(make_request()) == "10.0.0.1"
+
+
+def test_client_ip_ignores_header_when_untrusted(monkeypatch):
+    monkeypatch.setattr(server, "TRUST_FORWARDED_FOR", False)
+    assert server.client_ip(make_request("203.0.113.7")) == "10.0.0.1"
+
+
+def test_login_rate_limit_returns_429_with_retry_after(clock, monkeypatch):
+    monkeypatch.setattr(server, "login_email_limiter", server.TokenBucketLimiter(60, 1))
+    monkeypatch.setattr(server, "login_ip_limiter", server.TokenBucketLimiter(600, 100))
+    server.enforce_login_rate_limit("Someone@Email.com", "1.2.3.4")
+    with pytest.raises(HTTPException) as exc:
+        server.enforce_login_rate_limit("someone@email.com", "5.6.7.8")
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "1"
+
+
+def test_password_work_sheds_with_503_when_slots_are_busy(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(server, "password_check_slots", asyncio.Semaphore(1))
+        async with server.password_check_slots:
+            with pytest.raises(HTTPException) as exc:
+                await server.run_password_work(lambda: None)
+        assert exc.value.status_code == 503
+        assert exc.value.headers["Retry-After"] == "1"
+        assert await server.run_password_work(lambda x: x * 2, 21) == 42
+
+    asyncio.run(scenario())
+
+
+def test_worker_share_splits_limits_across_workers(monkeypatch):
+    monkeypatch.setattr(server, "WEB_CONCURRENCY", 4)
+    assert server.worker_share(30) == 7.5
+    monkeypatch.setattr(server, "WEB_CONCURRENCY", 1)
+    assert server.worker_share(30) == 30
@@ -0,0 +1,98 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from pymongo.errors import DuplicateKeyError
+
+import server
+
+
+class FakeLeases:
+    """Emulates find_one_and_update with upsert on a collection keyed by lease name"""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def find_one_and_update(self, query, update, upsert=False):
+        current = self.documents.get(query["_id"])
+        owner, expiry = query["$or"][0]["owner"], query["$or"][1]["expires_at"]["$lt"]
+        if current and (current["owner"] == owner or current["expires_at"] < expiry):
+            current.update(update["$set"])
+            return current
+        if current:
+            # The upsert tries to insert a second document with the same _id
+            raise DuplicateKeyError("E11000 duplicate key error index: _id_")
+        self.documents[query["_id"]] = {"_id": query["_id"], **update["$set"]}
+
+
+def acquire(monkeypatch, leases, worker):
+    monkeypatch.setattr(server, "db", SimpleNamespace(leases=leases))
+    monkeypatch.setattr(server, "WORKER_ID", worker)
+    return asyncio.run(server.acquire_lease("class_lifecycle", 60))
+
+
+def test_lease_goes_to_one_worker_and_is_renewed_by_it(monkeypatch):
+    leases = FakeLeases()
+    assert acquire(monkeypatch, leases, "worker-a")
+    assert acquire(monkeypatch, leases, "worker-a")
+    assert leases.documents["class_lifecycle"]["owner"] == "worker-a"
+
+
+def test_lease_is_lost_to_a_live_lease(monkeypatch):
+    leases = FakeLeases()
+    assert acquire(monkeypatch, leases, "worker-a")
+    assert not acquire(monkeypatch, leases, "worker-b")
+    assert leases.documents["class_lifecycle"]["owner"] == "worker-a"
+
+
+def test_expired_lease_is_taken_over(monkeypatch):
+    leases = FakeLeases()
+    leases.documents["class_lifecycle"] = {
+        "_id": "class_lifecycle", "owner": "worker-a", "expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)
+    }
+    assert acquire(monkeypatch, leases, "worker-b")
+    assert leases.documents["class_lifecycle"]["owner"] == "worker-b"
+
+
+class Recorder:
+    def __init__(self, name, log, batches=(), modified=0):
+        self.name = name
+        self.log = log
+        self.batches = list(batches)
+        self.modified = modified
+        self.calls = []
+
+    def find(self, query, projection=None):
+        batch = self.batches.pop(0) if self.batches else []
+        cursor = SimpleNamespace(to_list=lambda length=None: asyncio.sleep(0, batch))
+        return SimpleNamespace(limit=lambda count: cursor)
+
+    async def update_many(self, query, update):
+        self.log.append(self.name)
+        self.calls.append((query, update))
+        return SimpleNamespace(modified_count=self.modified)
+
+
+def test_complete_ended_classes_marks_no_shows_before_completing(monkeypatch):
+    first = [{"_id": uuid.uuid4()} for _ in range(2)]
+    second = [{"_id": uuid.uuid4()}]
+    writes = []
+    classes = Recorder("classes", writes, [first, second], modified=2)
+    bookings = Recorder("bookings", writes, modified=3)
+
+    async def locations():
+        return ["main"]
+
+    monkeypatch.setattr(server, "db", SimpleNamespace(classes=classes, bookings=bookings))
+    monkeypatch.setattr(server, "gym_ids", locations)
+    monkeypatch.setattr(server, "LIFECYCLE_BATCH_SIZE", 2)
+
+    result = asyncio.run(server.complete_ended_classes())
+    # A full batch is followed by another; the short one ends the location
+    assert result == {"classes_completed": 4, "bookings_no_show": 6}
+    assert writes == ["bookings", "classes", "bookings", "classes"]
+    query, update = bookings.calls[0]
+    assert query["class_id"] == {"$in": [str(cls["_id"]) for cls in first]}
+    assert query["status"] == server.BookingStatus.BOOKED
+    assert update == {"$set": {"status": server.BookingStatus.NO_SHOW}}
@@ -0,0 +1,52 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import server
+
+NOW = datetime(2025, 3, 1, 12, tzinfo=timezone.utc)
+MEMBER = server.UserBase(email="m@email.com", full_name="Member", role=server.UserRole.MEMBER)
+
+
+def booking_row(source, at, booking_id=None):
+    return {
+        "_id": booking_id or uuid.uuid4(), "gym_id": MEMBER.gym_id, "member_id": MEMBER.id,
+        "class_id": "c1", "class_name": "Yoga", "class_start_time": at, "booking_time": at,
+        "timeline_type": source, "timeline_at": at,
+    }
+
+
+def run_timeline(monkeypatch, rows, limit):
+    pipelines = []
+
+    def aggregate(pipeline):
+        pipelines.append(pipeline)
+        return SimpleNamespace(to_list=lambda length=None: asyncio.sleep(0, rows[:length]))
+
+    monkeypatch.setattr(server, "db", {"bookings": SimpleNamespace(aggregate=aggregate)})
+    return asyncio.run(server.get_timeline(cursor=None, limit=limit, current_user=MEMBER)), pipelines[0]
+
+
+def test_timeline_unions_archived_bookings_with_the_same_keyset():
+    after = (NOW, uuid.uuid4())
+    hot = server.timeline_pipeline("booking", MEMBER, after, 5)
+    archived = server.timeline_pipeline("archived_booking", MEMBER, after, 5)
+    assert archived[0]["$match"] == hot[0]["$match"]
+    assert archived[-1]["$set"]["timeline_type"] == "archived_booking"
+
+
+def test_archived_bookings_read_as_bookings_and_duplicates_collapse(monkeypatch):
+    moving = uuid.uuid4()
+    rows = [
+        booking_row("booking", NOW, moving),
+        # Mid-archive: the same booking was copied but not yet deleted
+        booking_row("archived_booking", NOW, moving),
+        booking_row("archived_booking", NOW - timedelta(days=400)),
+        booking_row("archived_booking", NOW - timedelta(days=401)),
+    ]
+    result, pipeline = run_timeline(monkeypatch, rows, limit=3)
+    unions = [stage["$unionWith"]["coll"] for stage in pipeline if "$unionWith" in stage]
+    assert "bookings_archive" in unions
+    assert [item["type"] for item in result["items"]] == ["booking", "booking"]
+    assert server.decode_timeline_cursor(result["next_cursor"]) == (NOW - timedelta(days=400), rows[2]["_id"])
@@ -0,0 +1,99 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+
+import server
+
+
+class FakeSession:
+    def __init__(self):
+        self.transactions = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def with_transaction(self, callback):
+        self.transactions += 1
+        return await callback(self)
+
+
+def test_run_transaction_without_transactions_passes_no_session(monkeypatch):
+    monkeypatch.setattr(server, "transactions_enabled", False)
+
+    async def callback(session):
+        return session
+
+    assert asyncio.run(server.run_transaction(callback)) is None
+
+
+def test_run_transaction_runs_callback_in_a_session(monkeypatch):
+    session = FakeSession()
+
+    async def start_session():
+        return session
+
+    monkeypatch.setattr(server, "transactions_enabled", True)
+    monkeypatch.setattr(server, "client", SimpleNamespace(start_session=start_session))
+
+    async def callback(given):
+        return given
+
+    assert asyncio.run(server.run_transaction(callback)) is session
+    assert session.transactions == 1
+
+
+class Writes:
+    def __init__(self, modified=1):
+        self.modified = modified
+        self.updates = []
+
+    async def update_one(self, query, update, **kwargs):
+        self.updates.append(update)
+        return SimpleNamespace(modified_count=self.modified)
+
+
+def cancel(monkeypatch, modified):
+    booking_id = uuid.uuid4()
+    member = server.UserBase(email="m@email.com", full_name="Member", role=server.UserRole.MEMBER)
+    booking = {"_id": booking_id, "member_id": member.id, "class_id": str(uuid.uuid4()), "class_name": "Yoga"}
+
+    async def find_booking(query):
+        return booking
+
+    bookings = Writes(modified)
+    bookings.find_one = find_booking
+    fake = SimpleNamespace(bookings=bookings, classes=Writes(), member_stats=Writes())
+    notified = []
+
+    async def notify(*args):
+        notified.append(args)
+
+    monkeypatch.setattr(server, "db", fake)
+    monkeypatch.setattr(server, "transactions_enabled", False)
+    monkeypatch.setattr(server, "create_notification", notify)
+    try:
+        result = asyncio.run(server.cancel_booking(str(booking_id), member))
+    except HTTPException as exc:
+        result = exc
+    return fake, notified, result
+
+
+def test_cancel_booking_releases_the_seat_and_counts_the_cancellation(monkeypatch):
+    fake, notified, result = cancel(monkeypatch, modified=1)
+    assert result == {"message": "Booking cancelled successfully"}
+    assert fake.classes.updates == [{"$inc": {"enrolled_count": -1}}]
+    assert fake.member_stats.updates[0]["$inc"] == {"classes_cancelled": 1}
+    assert len(notified) == 1
+
+
+def test_repeated_cancel_changes_nothing(monkeypatch):
+    fake, notified, error = cancel(monkeypatch, modified=0)
+    assert error.status_code == 400
+    # Only the request that flipped the status may release the seat
+    assert fake.classes.updates == [] and fake.member_stats.updates == []
+    assert notified == []
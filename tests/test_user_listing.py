@@ -0,0 +1,85 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, Response
+from starlette.requests import Request
+
+import server
+
+
+def test_user_cursor_round_trips():
+    user_id = uuid.uuid4()
+    cursor = server.encode_user_cursor("ada lovelace", user_id)
+    assert server.decode_user_cursor(cursor) == ("ada lovelace", user_id)
+
+
+def test_invalid_user_cursor_is_rejected():
+    with pytest.raises(HTTPException) as exc:
+        server.decode_user_cursor("not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+def test_users_after_keeps_filters_and_seeks_past_the_cursor():
+    user_id = uuid.uuid4()
+    query = server.in_gym("main", {"is_approved": False})
+    paged = server.users_after(query, server.encode_user_cursor("bob", user_id))
+    assert paged["$and"][0] == query
+    assert paged["$and"][1]["$or"] == [
+        {"full_name_lower": {"$gt": "bob"}},
+        {"full_name_lower": "bob", "_id": {"$gt": user_id}},
+    ]
+
+
+class FakeUsers:
+    def __init__(self, documents):
+        self.documents = documents
+        self.counts = 0
+
+    def find(self, query, projection=None):
+        documents = self.documents
+        cursor = SimpleNamespace(to_list=lambda length=None: asyncio.sleep(0, documents[:length]))
+        cursor.sort = lambda sort: SimpleNamespace(limit=lambda count: cursor)
+        return cursor
+
+    async def count_documents(self, query):
+        self.counts += 1
+        return len(self.documents)
+
+
+def list_users(monkeypatch, users, cursor=None):
+    monkeypatch.setattr(server, "read_db", SimpleNamespace(users=users))
+    admin = server.UserBase(email="a@email.com", full_name="Admin", role=server.UserRole.ADMIN)
+    request = Request({"type": "http", "headers": []})
+    response = Response()
+    page = asyncio.run(server.get_users(
+        request, response, role=None, is_approved=None, is_active=None, q=None,
+        cursor=cursor, limit=2, current_user=admin
+    ))
+    return page, response.headers
+
+
+def user_document(name):
+    return {
+        "_id": uuid.uuid4(), "email": f"{name}@email.com", "full_name": name.title(),
+        "full_name_lower": name, "role": "member",
+    }
+
+
+def test_first_page_counts_and_links_to_the_next(monkeypatch):
+    users = FakeUsers([user_document(name) for name in ("ann", "bob", "cat")])
+    page, headers = list_users(monkeypatch, users)
+    assert [user.full_name for user in page] == ["Ann", "Bob"]
+    assert headers["X-Total-Count"] == "3"
+    name, user_id = server.decode_user_cursor(headers["X-Next-Cursor"])
+    assert (name, user_id) == ("bob", users.documents[1]["_id"])
+
+
+def test_later_pages_skip_the_count(monkeypatch):
+    users = FakeUsers([user_document("cat")])
+    cursor = server.encode_user_cursor("bob", uuid.uuid4())
+    page, headers = list_users(monkeypatch, users, cursor)
+    assert [user.full_name for user in page] == ["Cat"]
+    assert users.counts == 0
+    assert "X-Total-Count" not in headers and "X-Next-Cursor" not in headers
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Supreme Fitness Gym Worker Scaling Harness
+Starts the backend with 1..N uvicorn workers on this machine and measures
+authenticated request throughput for each worker count.
+
+Requires a reachable MongoDB (MONGO_URL) and must be run from the repo root:
+    python worker_scaling_test.py --workers 1 2 4 --duration 15
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+
+
+def wait_until_ready(base_url, timeout=60):
+    """Poll the OpenAPI schema until the server answers"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/openapi.json", timeout=2).status_code == 200:
+                return True
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def start_server(workers, port):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+def get_member_token(base_url):
+    """Register a throwaway member and log in once (logins are rate limited)"""
+    email = f"scaling.{int(time.time() * 1000)}@email.com"
+    password = "ScalingTest2024!"
+    requests.post(f"{base_url}/api/register", json={
+        "email": email,
+        "password": password,
+        "full_name": "Scaling Test",
+        "role": "member"
+    }, timeout=30).raise_for_status()
+    response = requests.post(f"{base_url}/api/login", json={"email": email, "password": password}, timeout=30)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def run_load(base_url, path, token, concurrency, duration):
+    """Hammer path from concurrency threads for duration seconds; returns (ok, errors)"""
+    counts = {"ok": 0, "errors": 0}
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def worker():
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {token}"
+        ok = errors = 0
+        while time.time() < stop_at:
+            try:
+                if session.get(f"{base_url}{path}", timeout=30).status_code == 200:
+                    ok += 1
+                else:
+                    errors += 1
+            except requests.exceptions.RequestException:
+                errors += 1
+        with lock:
+            counts["ok"] += ok
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts["ok"], counts["errors"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--path", default="/api/classes")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = []
+    for workers in args.workers:
+        print(f"\n=== {workers} worker(s) ===")
+        server = start_server(workers, args.port)
+        try:
+            if not wait_until_ready(base_url):
+                print(f"❌ Server with {workers} worker(s) did not start")
+                continue
+            token = get_member_token(base_url)
+            # Short warm-up so every worker has connected and filled its caches
+            run_load(base_url, args.path, token, args.concurrency, 2)
+            ok, errors = run_load(base_url, args.path, token, args.concurrency, args.duration)
+            throughput = ok / args.duration
+            results.append((workers, throughput, errors))
+            print(f"✅ {throughput:.1f} req/s ({errors} errors)")
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    if results:
+        baseline = results[0][1] or 1
+        print("\n=== SCALING SUMMARY ===")
+        for workers, throughput, errors in results:
+            print(f"{workers:>3} worker(s): {throughput:9.1f} req/s  x{throughput / baseline:.2f}  errors={errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Supreme Fitness Gym Write Latency Harness
+Measures latency of the multi-write handlers (booking, cancel_booking,
+create-order, complete_payment) against a running backend.
+
+Run it once per configuration to compare, e.g. a server started with
+MONGO_TRANSACTIONS=true against a replica set and one with
+MONGO_TRANSACTIONS=false:
+    python write_latency_test.py --base-url http://127.0.0.1:8001 --iterations 200
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+
+def register_and_login(base_url, role):
+    email = f"latency.{role}.{int(time.time() * 1000)}@email.com"
+    password = "LatencyTest2024!"
+    requests.post(f"{base_url}/api/register", json={
+        "email": email,
+        "password": password,
+        "full_name": f"Latency {role.title()}",
+        "role": role
+    }, timeout=30).raise_for_status()
+    response = requests.post(f"{base_url}/api/login", json={"email": email, "password": password}, timeout=30)
+    response.raise_for_status()
+    body = response.json()
+    return body["access_token"], body["user"]["id"]
+
+
+def timed(samples, name, call):
+    started = time.perf_counter()
+    response = call()
+    samples.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+    response.raise_for_status()
+    return response.json()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8001")
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    base_url = args.base_url
+    admin_token, admin_id = register_and_login(base_url, "admin")
+    member_token, _ = register_and_login(base_url, "member")
+    admin = requests.Session()
+    admin.headers["Authorization"] = f"Bearer {admin_token}"
+    member = requests.Session()
+    member.headers["Authorization"] = f"Bearer {member_token}"
+
+    start = datetime.now(timezone.utc) + timedelta(days=7)
+    gym_class = admin.post(f"{base_url}/api/classes", json={
+        "name": "Latency Test Class",
+        "description": "Created by write_latency_test.py",
+        "trainer_id": admin_id,
+        "start_time": start.isoformat(),
+        "end_time": (start + timedelta(hours=1)).isoformat(),
+        "capacity": args.iterations * 2 + 10,
+        "price": 10.0
+    }, timeout=30)
+    gym_class.raise_for_status()
+    class_id = gym_class.json()["id"]
+
+    samples = {}
+    for _ in range(args.iterations):
+        # Pay for one booking, then cancel a second one
+        booking = timed(samples, "book", lambda: member.post(f"{base_url}/api/bookings", json={"class_id": class_id}, timeout=30))
+        order = timed(samples, "create-order", lambda: member.post(
+            f"{base_url}/api/payments/create-order", params={"booking_id": booking["id"]}, timeout=30
+        ))
+        timed(samples, "complete", lambda: member.post(
+            f"{base_url}/api/payments/{order['order_id']}/complete",
+            params={"paypal_order_id": order.get("paypal_order_id") or f"LATENCY_{time.time_ns()}"},
+            timeout=30
+        ))
+        timed(samples, "cancel", lambda: member.put(f"{base_url}/api/bookings/{booking['id']}/cancel", timeout=30))
+
+    print(f"\n=== WRITE LATENCY ({args.iterations} iterations) ===")
+    print(f"{'handler':<14}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for name, values in samples.items():
+        print(f"{name:<14}{percentile(values, 0.5):>10.1f}{percentile(values, 0.95):>10.1f}{statistics.mean(values):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()